@@ -3,6 +3,11 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve this application (e.g. ``uvicorn config.asgi:application``) to enable
+the live comment stream on post pages. Stream requests are answered by
+``CommentStreamRouter`` as one coroutine per connected reader rather than a
+worker thread; everything else goes to Django as usual.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +18,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+# Set up Django first - the router below imports models and URLs
+django_application = get_asgi_application()
+
+from miniblog.events import CommentStreamRouter  # noqa: E402
+
+application = CommentStreamRouter(django_application)
@@ -0,0 +1,24 @@
+"""
+Settings for servers booted by `python manage.py loadtest`.
+
+Every virtual user connects from 127.0.0.1 and logs in to a handful of
+shared accounts, so the per-IP and per-account login throttles would turn
+most logins into 429s and measure the throttle instead of the site. They
+are switched off here unless the command was given --throttle, which sets
+LOADTEST_THROTTLE=1.
+
+DEBUG is off as it would be in production. With it on, every SQL query is
+recorded and each 404 from browsing past the last page renders the
+technical 404 page, so the numbers would mostly measure debug overhead.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+if not os.environ.get('LOADTEST_THROTTLE'):
+    AUTH_THROTTLE_IP = None
+    AUTH_THROTTLE_ACCOUNT = None
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 # Order matters! Each middleware processes requests top-to-bottom, responses bottom-to-top
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',        # Security enhancements
+    'miniblog.surrogate_keys.SurrogateKeyMiddleware',       # Cache tags and purges for the proxy
     'django.contrib.sessions.middleware.SessionMiddleware', # Session handling
     'django.middleware.common.CommonMiddleware',            # Common functionality
     'django.middleware.csrf.CsrfViewMiddleware',           # CSRF protection
@@ -96,6 +97,40 @@ DATABASES = {
 }
 
 
+# Password hashing profiles
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+# The first hasher in the list is used for new passwords; the others are kept
+# so existing hashes still verify (and are upgraded on the next login).
+# 'argon2' needs the argon2-cffi package.
+PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': [
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ],
+    'argon2': [
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ],
+    'scrypt': [
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    ],
+}
+
+# Which profile this deployment uses
+PASSWORD_HASHER_PROFILE = 'pbkdf2'
+PASSWORD_HASHERS = PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]
+
+
 # Password validation rules
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 # These validators ensure users create secure passwords
@@ -144,3 +179,67 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 # Uses 64-bit integers for primary keys
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Live comment stream settings (see miniblog/events.py)
+# Broker class that fans new comments out to Server-Sent Events subscribers.
+# InProcessBroker serves a single ASGI worker; LocalBroker is a stand-in for
+# an external broker, and a shared broker is needed for several workers.
+COMMENT_BROKER = 'miniblog.events.InProcessBroker'
+
+# Seconds between keep-alive lines on an idle stream
+COMMENT_STREAM_HEARTBEAT = 15
+
+# Messages buffered per subscriber before a slow client is disconnected
+COMMENT_STREAM_QUEUE_SIZE = 100
+
+# Sitemap settings (see miniblog/sitemaps.py)
+# URLs per child sitemap - posts and authors are sharded by id range
+SITEMAP_SHARD_SIZE = 5000
+
+# Rows fetched per keyset query while streaming a shard
+SITEMAP_BATCH_SIZE = 500
+
+# Seconds the sitemap index's shard list is cached
+SITEMAP_INDEX_TIMEOUT = 300
+
+# Seconds a rendered shard is cached - unchanged shards are never rebuilt sooner
+SITEMAP_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Auth guard settings (see miniblog/auth_guard.py)
+# Threads that run password hashing for login and registration.
+# 0 hashes inline in the request thread with no admission control.
+AUTH_HASH_WORKERS = 2
+
+# Auth requests allowed to wait for a hashing thread; more are shed with a 503.
+# Keep AUTH_HASH_WORKERS + AUTH_HASH_QUEUE_SIZE below the server's thread count.
+AUTH_HASH_QUEUE_SIZE = 4
+
+# Token-bucket throttles as (attempts, seconds), or None to disable
+AUTH_THROTTLE_IP = (20, 60)       # Per client IP address
+AUTH_THROTTLE_ACCOUNT = (5, 60)   # Per username being logged in to
+
+# Addresses or networks of reverse proxies in front of the site. Requests
+# arriving from them are throttled by the client address in X-Forwarded-For
+# instead of by the proxy's own address, e.g. ['127.0.0.1', '10.0.0.0/8'].
+AUTH_TRUSTED_PROXIES = []
+
+# Logins look users up on the request thread and verify the password on the
+# auth guard's pool
+AUTHENTICATION_BACKENDS = ['miniblog.auth_guard.GuardedModelBackend']
+
+# Surrogate key settings (see miniblog/surrogate_keys.py)
+# Purger that tells the fronting HTTP cache which keys went stale.
+# InMemoryPurger only records purges (development and tests). HTTPPurger
+# POSTs them to a purge API; `python manage.py purge_standin` runs a local
+# stand-in for it on port 8081:
+#   CACHE_PURGER = 'miniblog.surrogate_keys.HTTPPurger'
+#   CACHE_PURGER_OPTIONS = {'url': 'http://127.0.0.1:8081/purge'}
+CACHE_PURGER = 'miniblog.surrogate_keys.InMemoryPurger'
+CACHE_PURGER_OPTIONS = {}
+
+# Worker warm-up settings (see miniblog/warmup.py and config/gunicorn.conf.py)
+# Pages requested once while a worker warms up, so the full request path
+# (middleware, views, template rendering) has already run before real traffic.
+# Keep these to read-only pages.
+WARMUP_URLS = ['/']
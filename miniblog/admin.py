@@ -10,6 +10,18 @@ from . import models
 # Advanced admin configuration using decorators and ModelAdmin classes
 # This provides more control over how models appear in the admin interface
 
+@admin.register(models.Tag)  # Decorator to register Tag model with custom admin
+class TagAdmin(admin.ModelAdmin):
+    """
+    Custom admin interface for Tag model
+    post_count is maintained by the app, so it is shown but not editable
+    """
+    list_display = ('name', 'slug', 'post_count')
+    search_fields = ('name', 'slug')
+    readonly_fields = ('post_count',)
+    prepopulated_fields = {'slug': ('name',)}
+    ordering = ('-post_count',)
+
 @admin.register(models.Post)  # Decorator to register Post model with custom admin
 class PostAdmin(admin.ModelAdmin):
     """
@@ -13,3 +13,9 @@ class MiniblogConfig(AppConfig):
     
     # The name of the app - must match the app directory name
     name = 'miniblog'
+    
+    def ready(self):
+        """
+        Called once Django has loaded all apps - connect our signal handlers
+        """
+        from . import signals  # noqa: F401
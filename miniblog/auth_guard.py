@@ -0,0 +1,312 @@
+# Import standard library tools for throttling and bounded execution
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Import Django utilities
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from django.core.exceptions import PermissionDenied
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# Auth guard - keeps password hashing from starving the rest of the site.
+#
+# Logging in and registering run a deliberately slow password hash (PBKDF2
+# by default). Left alone, a burst of logins occupies every worker thread
+# with hashing and page views queue behind it. The guard puts three things
+# in front of that work:
+#   1. Token-bucket throttles per client IP and per account name, checked
+#      before any hashing happens.
+#   2. Admission control - only a bounded number of hashes may be running or
+#      queued at once; anything beyond that is shed immediately with a 503.
+#   3. A small dedicated thread pool that does the hashing, so at most
+#      AUTH_HASH_WORKERS cores are ever spent on it.
+# Only the pure CPU work (hashing and verifying) runs on the pool. Database
+# reads and writes stay on the request thread, inside whatever transaction
+# the request is in.
+# An admitted request still waits in its own thread for the hash, so at most
+# AUTH_HASH_WORKERS + AUTH_HASH_QUEUE_SIZE server threads are ever busy with
+# auth. Keep that below the server's thread count and page views always have
+# threads left to run on.
+
+
+class AuthRejected(Exception):
+    """
+    Base class for auth attempts refused before any hashing ran
+    retry_after is a hint in seconds for the Retry-After header.
+    """
+    status = 503
+    message = ''
+
+    def __init__(self, retry_after):
+        super().__init__(self.message)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class AuthThrottled(AuthRejected):
+    """
+    Too many attempts from this IP address or for this account
+    """
+    status = 429
+    message = 'Too many attempts. Please wait a moment and try again.'
+
+
+class AuthOverloaded(AuthRejected):
+    """
+    Too many logins and registrations are already being processed
+    """
+    status = 503
+    message = 'We are handling a lot of sign-ins right now. Please try again shortly.'
+
+
+# =============================================================================
+# THROTTLING
+# =============================================================================
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to capacity tokens, refilled continuously
+    at rate tokens per second. Each attempt takes one token.
+    """
+    __slots__ = ('capacity', 'rate', 'tokens', 'updated')
+
+    def __init__(self, capacity, rate, now):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now):
+        """
+        Take a token; return 0 on success or the seconds until one is available
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class Throttle:
+    """
+    In-memory token buckets keyed by an arbitrary string (IP, username)
+    Limits are per process. Least recently used keys are evicted once
+    max_keys is reached, so memory stays bounded under a spray of addresses.
+    """
+    def __init__(self, attempts, period, max_keys=10000, clock=time.monotonic):
+        self.capacity = attempts
+        self.rate = attempts / period
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """
+        Consume one attempt for key; return 0 or the seconds to wait
+        """
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.capacity, self.rate, now)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(now)
+
+
+# =============================================================================
+# CLIENT ADDRESS
+# =============================================================================
+
+def client_ip(request, trusted_proxies=()):
+    """
+    The address of the client that sent request
+    Behind a reverse proxy REMOTE_ADDR is the proxy itself. When it is one of
+    trusted_proxies (addresses or networks), X-Forwarded-For is walked from
+    the right, skipping further trusted hops; the first other address is the
+    client. Entries left of it could have been forged by the client.
+    """
+    ip = request.META.get('REMOTE_ADDR')
+    forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+    forwarded = [part for part in forwarded if part]
+    while forwarded and _is_trusted(ip, trusted_proxies):
+        ip = forwarded.pop()
+    return ip
+
+
+def _is_trusted(ip, trusted_proxies):
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_proxies)
+
+
+# =============================================================================
+# GUARD
+# =============================================================================
+
+class AuthGuard:
+    """
+    Throttles, admits and runs password-hashing work for the auth views
+    With workers=0 the work runs inline in the request thread (throttles
+    still apply) - the behaviour before the guard existed.
+    """
+    def __init__(self, workers=2, queue_size=4, ip_limit=None, account_limit=None, trusted_proxies=()):
+        self.workers = workers
+        self.ip_throttle = Throttle(*ip_limit) if ip_limit else None
+        self.account_throttle = Throttle(*account_limit) if account_limit else None
+        self.trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in trusted_proxies]
+        self._executor = None
+        self._slots = None
+        if workers:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='auth-hash')
+            # Hashes running plus hashes waiting for a worker
+            self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def check(self, ip, account=None):
+        """
+        Raise AuthThrottled if the IP or account has run out of attempts
+        """
+        waits = []
+        if self.ip_throttle and ip:
+            waits.append(self.ip_throttle.take(f'ip:{ip}'))
+        if self.account_throttle and account:
+            waits.append(self.account_throttle.take(f'account:{account.lower()}'))
+        wait = max(waits, default=0)
+        if wait:
+            raise AuthThrottled(wait)
+
+    def check_request(self, request, account=None):
+        """
+        Throttle an attempt made by request (None for callers without one)
+        """
+        if request is not None:
+            self.check(client_ip(request, self.trusted_proxies), account)
+
+    def run(self, request, account, func, *args, **kwargs):
+        """
+        Throttle the attempt, then hash through the pool with execute()
+        """
+        self.check_request(request, account)
+        return self.execute(func, *args, **kwargs)
+
+    def execute(self, func, *args, **kwargs):
+        """
+        Run func - pure hashing, no database access - on the pool
+        Raises AuthOverloaded instead of running it when the pool is saturated.
+        """
+        if self._executor is None:
+            return func(*args, **kwargs)
+
+        # Never block waiting for a slot - a waiting request is a pinned thread
+        if not self._slots.acquire(blocking=False):
+            raise AuthOverloaded(1)
+        try:
+            return self._executor.submit(func, *args, **kwargs).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+@lru_cache(maxsize=None)
+def get_auth_guard():
+    """
+    Return the process-wide guard configured from the AUTH_* settings
+    """
+    return AuthGuard(
+        workers=getattr(settings, 'AUTH_HASH_WORKERS', 2),
+        queue_size=getattr(settings, 'AUTH_HASH_QUEUE_SIZE', 4),
+        ip_limit=getattr(settings, 'AUTH_THROTTLE_IP', None),
+        account_limit=getattr(settings, 'AUTH_THROTTLE_ACCOUNT', None),
+        trusted_proxies=getattr(settings, 'AUTH_TRUSTED_PROXIES', ()),
+    )
+
+
+def reset_auth_guard():
+    """
+    Drop the process-wide guard, and with it every throttle bucket
+    Tests call this between cases so attempts never carry over.
+    """
+    if get_auth_guard.cache_info().currsize:
+        get_auth_guard().shutdown()
+    get_auth_guard.cache_clear()
+
+
+@receiver(setting_changed)
+def guard_setting_changed(setting, **kwargs):
+    """
+    Rebuild the guard when override_settings changes its configuration
+    """
+    if setting.startswith(('AUTH_HASH_', 'AUTH_THROTTLE_')) or setting == 'AUTH_TRUSTED_PROXIES':
+        reset_auth_guard()
+
+
+# =============================================================================
+# AUTHENTICATION BACKEND
+# =============================================================================
+
+def verify_password(raw_password, encoded):
+    """
+    Check raw_password against a stored hash without touching the database
+    Returns (valid, new_hash). new_hash is set when the stored hash uses an
+    outdated algorithm or work factor, for the caller to save.
+    """
+    valid = check_password(raw_password, encoded)
+    new_hash = None
+    if valid:
+        preferred = get_hasher('default')
+        if identify_hasher(encoded).algorithm != preferred.algorithm or preferred.must_update(encoded):
+            new_hash = make_password(raw_password)
+    return valid, new_hash
+
+
+class GuardedModelBackend(ModelBackend):
+    """
+    ModelBackend that throttles attempts and verifies passwords on the guard's pool
+    The user lookup and any hash upgrade are saved on the request thread.
+    A refused attempt is left on request.auth_rejected and reported to
+    authenticate() as PermissionDenied, so callers that know about the
+    guard (user_login) can answer 429/503 and others see a failed login.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        guard = get_auth_guard()
+        try:
+            guard.check_request(request, username)
+            try:
+                user = UserModel._default_manager.get_by_natural_key(username)
+            except UserModel.DoesNotExist:
+                # Hash anyway so unknown usernames take as long as known ones
+                guard.execute(make_password, password)
+                return None
+            valid, new_hash = guard.execute(verify_password, password, user.password)
+        except AuthRejected as rejection:
+            if request is not None:
+                request.auth_rejected = rejection
+            raise PermissionDenied from rejection
+
+        if valid and new_hash:
+            user.password = new_hash
+            user.save(update_fields=['password'])
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
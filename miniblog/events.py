@@ -0,0 +1,389 @@
+# Import standard library tools for async fan-out between threads and the event loop
+import asyncio
+import json
+import queue
+import threading
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+# Import Django utilities
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+from django.utils import dateformat, timezone
+from django.utils.module_loading import import_string
+
+# Live comment events - a small publish/subscribe layer used by the
+# Server-Sent Events stream on the post detail page.
+#
+# Publishers (the add_comment view) run in ordinary request threads, while
+# subscribers are coroutines parked on the ASGI event loop. An idle
+# subscriber is just an asyncio.Queue waiting for data, so thousands of open
+# connections cost no threads and never poll the database.
+
+
+def channel_for_post(post_id):
+    """
+    Name of the pub/sub channel carrying comments for one post
+    """
+    return f'post:{post_id}'
+
+
+def comment_payload(comment):
+    """
+    Build the JSON-serialisable message describing a new comment
+    Dates are pre-formatted to match the "F d, Y" format used in post_detail.html
+    """
+    return {
+        'id': comment.pk,
+        'post': comment.post_id,
+        'author': comment.author.username if comment.author else '',
+        'content': comment.content,
+        'date': dateformat.format(timezone.localtime(comment.date_posted), 'F d, Y'),
+    }
+
+
+# =============================================================================
+# SUBSCRIPTIONS
+# =============================================================================
+
+class Subscription:
+    """
+    One connected client listening on a channel
+    Messages are buffered in a bounded asyncio.Queue that belongs to the loop
+    the subscriber was created on. A client that falls too far behind is marked
+    as overflowed so its stream can end and the browser reconnects with
+    Last-Event-ID, catching up from the database instead of from memory.
+    """
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, message):
+        """
+        Queue a message for this subscriber - must be called on self.loop
+        """
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """
+        Wait for the next message, returning None if the timeout expires first
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        """
+        Stop receiving messages
+        """
+        self.broker.unsubscribe(self)
+
+
+# =============================================================================
+# BROKERS
+# =============================================================================
+
+class BaseBroker:
+    """
+    Interface every comment broker implements
+    publish() may be called from any thread; subscribe() must be called from
+    a coroutine running on the event loop that will consume the messages.
+    """
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    """
+    Default broker - fans messages out to subscribers in this process only
+    Suitable for a single ASGI worker. Deployments with several workers should
+    swap in a broker backed by a shared service via the COMMENT_BROKER setting.
+    """
+    def __init__(self, queue_size=100):
+        super().__init__(queue_size)
+        # channel name -> set of Subscription objects
+        self._channels = {}
+        # Publishers and subscribers live on different threads
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        """
+        Number of live subscriptions, for one channel or across all of them
+        """
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+    def publish(self, channel, message):
+        # Snapshot subscribers so delivery happens outside the lock
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+
+        # Group by event loop so each loop is woken once per message,
+        # not once per subscriber
+        by_loop = {}
+        for subscription in subscribers:
+            by_loop.setdefault(subscription.loop, []).append(subscription)
+
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver_all, group, message)
+            except RuntimeError:
+                # The loop has been closed - its subscribers are gone
+                for subscription in group:
+                    self.unsubscribe(subscription)
+
+    @staticmethod
+    def _deliver_all(subscriptions, message):
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+
+class LocalBroker(InProcessBroker):
+    """
+    Local stand-in for an external message broker (e.g. Redis pub/sub)
+    Messages are serialised to JSON and handed to a background thread that
+    plays the part of the broker connection, so publishers never touch
+    subscriber state directly. Useful for exercising the code paths a
+    networked broker would take without running one.
+    """
+    def __init__(self, queue_size=100):
+        super().__init__(queue_size)
+        self._outbox = queue.SimpleQueue()
+        self._worker = threading.Thread(target=self._run, name='comment-broker', daemon=True)
+        self._worker.start()
+
+    def publish(self, channel, message):
+        self._outbox.put((channel, json.dumps(message)))
+
+    def _run(self):
+        while True:
+            channel, data = self._outbox.get()
+            super().publish(channel, json.loads(data))
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """
+    Return the process-wide broker configured by settings.COMMENT_BROKER
+    """
+    broker_class = import_string(getattr(settings, 'COMMENT_BROKER', 'miniblog.events.InProcessBroker'))
+    return broker_class(queue_size=getattr(settings, 'COMMENT_STREAM_QUEUE_SIZE', 100))
+
+
+def publish_comment(comment):
+    """
+    Announce a newly saved comment to everyone watching its post
+    """
+    get_broker().publish(channel_for_post(comment.post_id), comment_payload(comment))
+
+
+# =============================================================================
+# SERVER-SENT EVENTS
+# =============================================================================
+
+def format_event(message):
+    """
+    Encode a comment message as a Server-Sent Events frame
+    The comment id doubles as the SSE event id so reconnecting browsers
+    send it back in the Last-Event-ID header.
+    """
+    data = json.dumps(message, separators=(',', ':'))
+    return f'id: {message["id"]}\nevent: comment\ndata: {data}\n\n'
+
+
+async def comment_event_stream(subscription, backlog=(), last_sent=0):
+    """
+    Async generator yielding SSE frames for a subscription
+    backlog holds comments a reconnecting browser missed; broker messages
+    with ids already sent are skipped so nothing is delivered twice.
+    """
+    heartbeat = getattr(settings, 'COMMENT_STREAM_HEARTBEAT', 15)
+
+    # Tell the browser how long to wait before reconnecting
+    yield 'retry: 3000\n\n'
+
+    for message in backlog:
+        last_sent = max(last_sent, message['id'])
+        yield format_event(message)
+
+    # An overflowed subscriber drains what it has, then ends the stream
+    while not (subscription.overflowed and subscription.queue.empty()):
+        message = await subscription.get(timeout=heartbeat)
+        if message is None:
+            # SSE comment line keeps proxies from closing an idle connection
+            yield ': keep-alive\n\n'
+        elif message['id'] > last_sent:
+            last_sent = message['id']
+            yield format_event(message)
+
+
+# =============================================================================
+# ASGI ENDPOINT
+# =============================================================================
+
+class CommentStreamRouter:
+    """
+    ASGI middleware serving the comment stream ahead of Django
+    Django's ASGI handler keeps a dedicated thread for every request that runs
+    sync middleware, for as long as the response lasts. For a stream that stays
+    open for minutes that means a thread per reader, so requests for the
+    comment-stream URL are answered here as a plain coroutine instead. Every
+    other request is passed through to the wrapped Django application.
+    """
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            post_id = self.match(self.path_info(scope))
+            if post_id is not None:
+                return await serve_comment_stream(scope, receive, send, post_id)
+        return await self.application(scope, receive, send)
+
+    @staticmethod
+    def path_info(scope):
+        """
+        Request path with the mount prefix removed, as Django's ASGIHandler does
+        The prefix is FORCE_SCRIPT_NAME if set, else the server's root_path.
+        """
+        script_name = settings.FORCE_SCRIPT_NAME or scope.get('root_path', '') or ''
+        return scope['path'].removeprefix(script_name)
+
+    @staticmethod
+    def match(path):
+        """
+        Return the post id if path is the comment-stream URL, else None
+        Resolving through the URLconf keeps the route defined in one place.
+        """
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return None
+        if match.url_name != 'comment-stream':
+            return None
+        return match.kwargs['pk']
+
+
+async def _send_plain(send, status, body=b''):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def serve_comment_stream(scope, receive, send, post_id):
+    """
+    Answer one Server-Sent Events connection for a post
+    The database is touched at most twice per connection - an existence check
+    and, for reconnecting browsers, one catch-up query. After that the
+    connection only waits on the broker.
+    """
+    from .models import Comment, Post  # Imported lazily - models need the app registry
+
+    if scope['method'] not in ('GET', 'HEAD'):
+        return await _send_plain(send, 405, b'Method Not Allowed')
+
+    # Browsers send back the id of the last event they saw when reconnecting.
+    # The first connection has no such header, so the page passes the newest
+    # comment it rendered as ?last_id= instead.
+    headers = dict(scope['headers'])
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    try:
+        last_event_id = int(headers[b'last-event-id'])
+    except (KeyError, ValueError):
+        try:
+            last_event_id = int(query['last_id'][0])
+        except (KeyError, ValueError):
+            last_event_id = None
+
+    # Subscribe before querying so no comment slips between the two
+    subscription = get_broker().subscribe(channel_for_post(post_id))
+    try:
+        exists = await Post.objects.filter(pk=post_id).aexists()
+        backlog = []
+        if exists and last_event_id is not None:
+            missed = Comment.objects.filter(post_id=post_id, pk__gt=last_event_id) \
+                .select_related('author').order_by('pk')
+            backlog = [comment_payload(comment) async for comment in missed]
+        # Mirror Django's end-of-request cleanup - the stream may live for hours
+        await sync_to_async(close_old_connections)()
+
+        if not exists:
+            return await _send_plain(send, 404, b'Not Found')
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),  # Stop nginx from buffering the stream
+            ],
+        })
+        if scope['method'] == 'HEAD':
+            return await send({'type': 'http.response.body', 'body': b''})
+
+        async def pump():
+            async for frame in comment_event_stream(subscription, backlog, last_event_id or 0):
+                await send({'type': 'http.response.body', 'body': frame.encode(), 'more_body': True})
+            # Stream ended on our side (slow client) - the browser will reconnect
+            await send({'type': 'http.response.body', 'body': b''})
+
+        # Stop as soon as either the stream ends or the client goes away
+        pump_task = asyncio.ensure_future(pump())
+        disconnect_task = asyncio.ensure_future(_wait_for_disconnect(receive))
+        done, pending = await asyncio.wait(
+            {pump_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED,
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if pump_task in done and pump_task.exception() is not None:
+            # Writing to a closed connection is just another way to disconnect
+            if not isinstance(pump_task.exception(), OSError):
+                raise pump_task.exception()
+    finally:
+        subscription.close()
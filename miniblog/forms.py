@@ -2,7 +2,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
-from .models import Post, Comment
+from .models import Post, Comment, Tag
 
 # Forms - These handle user input and validation
 
@@ -11,6 +11,66 @@ class PostForm(forms.ModelForm):
     Form for creating and editing blog posts
     ModelForm automatically generates form fields based on the Post model
     """
+    # Tags are typed as a comma-separated list; new names create new tags
+    tags = forms.CharField(
+        required=False,
+        help_text='Separate tags with commas, e.g. django, python',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'django, python'}),
+    )
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        # When editing, pre-fill the tags field with the post's current tags
+        if self.instance.pk and 'tags' not in self.initial:
+            self.initial['tags'] = ', '.join(tag.name for tag in self.instance.tags.all())
+    
+    def clean_tags(self):
+        """
+        Split the comma-separated input into a list of tag names
+        Tags are stored by slug, so names that have no slug (e.g. "++") or
+        that share one (e.g. "C++" and "C#" both become "c") are reported
+        instead of being silently dropped or merged, as are names too long
+        to store in full.
+        """
+        names = [name.strip() for name in self.cleaned_data['tags'].split(',') if name.strip()]
+        if len(names) > 10:
+            raise forms.ValidationError('A post can have at most 10 tags.')
+        
+        errors = []
+        by_slug = {}
+        max_length = Tag._meta.get_field('name').max_length
+        for name in names:
+            slug = Tag.make_slug(name)
+            if len(name) > max_length:
+                errors.append(f'"{name}" is longer than {max_length} characters.')
+            elif not slug:
+                errors.append(f'"{name}" needs at least one letter or digit from a-z or 0-9.')
+            elif slug in by_slug and by_slug[slug].lower() != name.lower():
+                errors.append(f'"{by_slug[slug]}" and "{name}" would be the same tag.')
+            else:
+                by_slug.setdefault(slug, name)
+        
+        # An existing tag with the same slug but a different name would swallow this one
+        for tag in Tag.objects.filter(slug__in=by_slug):
+            if tag.name.lower() != by_slug[tag.slug].lower():
+                errors.append(f'"{by_slug[tag.slug]}" would be filed under the existing tag "{tag.name}".')
+        
+        if errors:
+            raise forms.ValidationError(errors)
+        return names
+    
+    def save(self, commit=True):
+        """
+        Save the post, then its tags
+        With commit=False the caller saves the post and calls
+        post.set_tags(form.cleaned_data['tags']) itself.
+        """
+        post = super().save(commit=commit)
+        if commit:
+            post.set_tags(self.cleaned_data['tags'])
+        return post
+    
     class Meta:
         # Tell Django which model this form is for
         model = Post
@@ -0,0 +1,484 @@
+# Import standard library tools - the load generator has no third-party dependencies
+import http.client
+import importlib.util
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+# Load testing - drives a running copy of the site over real HTTP with a
+# weighted mix of user scenarios and records the latency of every request.
+# Used by the loadtest management command, which can also boot the app under
+# a WSGI or ASGI server so the two deployments can be compared like for like.
+
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+SCENARIOS = ('browse', 'login', 'post', 'comment')
+
+DEFAULT_MIX = {'browse': 70, 'login': 5, 'post': 5, 'comment': 20}
+
+
+# =============================================================================
+# SERVERS
+# =============================================================================
+
+# server name -> (interface, required module, command template)
+# {python}, {app}, {port} and {workers} are filled in by server_command()
+SERVERS = {
+    'gunicorn': ('wsgi', 'gunicorn', [
+        '{python}', '-m', 'gunicorn', '{app}', '--bind', '127.0.0.1:{port}',
+        '--workers', '{workers}', '--log-level', 'warning',
+    ]),
+    # Preloaded and warmed in the master before forking (config/gunicorn.conf.py)
+    'gunicorn-preload': ('wsgi', 'gunicorn', [
+        '{python}', '-m', 'gunicorn', '--config', 'config/gunicorn.conf.py', '{app}',
+        '--bind', '127.0.0.1:{port}', '--workers', '{workers}', '--log-level', 'warning',
+    ]),
+    'uvicorn': ('asgi', 'uvicorn', [
+        '{python}', '-m', 'uvicorn', '{app}', '--host', '127.0.0.1', '--port', '{port}',
+        '--workers', '{workers}', '--no-access-log', '--log-level', 'warning',
+    ]),
+    'gunicorn-uvicorn': ('asgi', 'uvicorn', [
+        '{python}', '-m', 'gunicorn', '{app}', '--bind', '127.0.0.1:{port}',
+        '--workers', '{workers}', '--worker-class', 'uvicorn.workers.UvicornWorker',
+        '--log-level', 'warning',
+    ]),
+    'daphne': ('asgi', 'daphne', [
+        '{python}', '-m', 'daphne', '--bind', '127.0.0.1', '--port', '{port}', '{app}',
+    ]),
+    # Django's development server - always available, single process
+    'runserver': ('wsgi', None, [
+        '{python}', 'manage.py', 'runserver', '127.0.0.1:{port}', '--noreload',
+    ]),
+}
+
+# Servers that can only run a single worker process
+SINGLE_PROCESS_SERVERS = ('daphne', 'runserver')
+
+APPLICATIONS = {'wsgi': 'config.wsgi:application', 'asgi': 'config.asgi:application'}
+
+
+def server_command(server, port, workers):
+    """
+    Build the command line that starts the given server
+    Raises ValueError if the server is unknown, not installed, or cannot
+    run the requested number of workers.
+    """
+    if server not in SERVERS:
+        raise ValueError(f'Unknown server {server!r}; choose from {", ".join(SERVERS)}')
+    interface, module, template = SERVERS[server]
+    if module and importlib.util.find_spec(module) is None:
+        raise ValueError(f'{server} needs the {module!r} package - pip install {module}')
+    if server == 'gunicorn-uvicorn' and importlib.util.find_spec('gunicorn') is None:
+        raise ValueError('gunicorn-uvicorn needs the gunicorn package - pip install gunicorn')
+    if server in SINGLE_PROCESS_SERVERS and workers != 1:
+        raise ValueError(f'{server} runs a single process; use --workers 1')
+    values = {
+        'python': sys.executable, 'app': APPLICATIONS[interface],
+        'port': str(port), 'workers': str(workers),
+    }
+    return [part.format(**values) for part in template]
+
+
+def free_port():
+    """
+    Ask the OS for an unused local TCP port
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ServerProcess:
+    """
+    Context manager that starts a server subprocess and waits until it accepts connections
+    The server's own output is discarded unless quiet is False. env holds
+    extra environment variables, e.g. DJANGO_SETTINGS_MODULE.
+    """
+    def __init__(self, command, port, cwd, startup_timeout=30, quiet=True, env=None):
+        self.command = command
+        self.env = env or {}
+        self.quiet = quiet
+        self.port = port
+        self.cwd = cwd
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self):
+        output = subprocess.DEVNULL if self.quiet else None
+        self.process = subprocess.Popen(
+            self.command, cwd=self.cwd, env={**os.environ, **self.env}, stdout=output, stderr=output,
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'Server exited with code {self.process.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f'Server did not start within {self.startup_timeout}s')
+
+    def __exit__(self, *exc_info):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+# =============================================================================
+# HTTP CLIENT
+# =============================================================================
+
+class Session:
+    """
+    Minimal browser stand-in: one keep-alive connection plus a cookie jar
+    Every request is timed and handed to the recorder.
+    """
+    def __init__(self, base_url, recorder, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.origin = f'{parts.scheme}://{parts.netloc}'
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = {}
+        self.connection = None
+        self.location = None  # Location header of the last redirect
+        self.retry_after = None  # Retry-After header of the last response
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def request(self, name, method, path, data=None, expect=(200,)):
+        """
+        Send one request and return (status, body), or (None, '') on error
+        name groups requests in the report, e.g. 'post:submit'.
+        """
+        headers = {'Host': f'{self.host}:{self.port}'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['Referer'] = self.origin + path
+
+        started = time.perf_counter()
+        try:
+            connection = self._connect()
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read().decode('utf-8', 'replace')
+        except (OSError, http.client.HTTPException) as exc:
+            self.close()
+            self.recorder.record(name, time.perf_counter() - started, None, type(exc).__name__)
+            return None, ''
+        elapsed = time.perf_counter() - started
+
+        for header in response.msg.get_all('Set-Cookie') or ():
+            for key, morsel in SimpleCookie(header).items():
+                if morsel.value:
+                    self.cookies[key] = morsel.value
+                else:
+                    self.cookies.pop(key, None)
+        self.location = response.getheader('Location')
+        self.retry_after = response.getheader('Retry-After')
+        if response.will_close:
+            self.close()
+
+        error = None if response.status in expect else f'HTTP {response.status}'
+        self.recorder.record(name, elapsed, response.status, error)
+        return response.status, content
+
+    def get(self, name, path, expect=(200,)):
+        return self.request(name, 'GET', path, expect=expect)
+
+    def post_form(self, name, form_path, action, fields, expect=(302,)):
+        """
+        GET a form page for its CSRF token, then POST the fields to action
+        """
+        status, content = self.get(f'{name}:form', form_path)
+        match = CSRF_INPUT.search(content)
+        if match is None:
+            return None, ''
+        data = dict(fields, csrfmiddlewaretoken=match.group(1))
+        return self.request(f'{name}:submit', 'POST', action, data, expect=expect)
+
+
+# =============================================================================
+# SCENARIOS
+# =============================================================================
+
+class VirtualUser:
+    """
+    One simulated visitor with two sessions
+    anonymous never logs in; member is used for logging in, posting and
+    commenting, and stays logged in between scenarios like a real browser.
+    """
+    def __init__(self, base_url, recorder):
+        self.anonymous = Session(base_url, recorder)
+        self.member = Session(base_url, recorder)
+
+    def close(self):
+        self.anonymous.close()
+        self.member.close()
+
+
+class Scenarios:
+    """
+    The user journeys replayed by each virtual user
+    Post ids and usernames seen so far are shared between virtual users so
+    browsing and commenting spread across real pages.
+    """
+    def __init__(self, post_ids, usernames, accounts, password):
+        self.post_ids = list(post_ids)
+        self.usernames = list(usernames)
+        self.accounts = list(accounts)
+        self.password = password
+        self.lock = threading.Lock()
+
+    def random_post(self, rng):
+        with self.lock:
+            return rng.choice(self.post_ids) if self.post_ids else None
+
+    def browse(self, user, rng):
+        """
+        Anonymous reader: home page, a later page, a post and an author
+        """
+        session = user.anonymous
+        session.get('browse:list', '/')
+        session.get('browse:page', f'/?page={rng.randint(2, 4)}', expect=(200, 404))
+        post_id = self.random_post(rng)
+        if post_id is not None:
+            session.get('browse:detail', f'/post/{post_id}/', expect=(200, 404))
+        if self.usernames:
+            session.get('browse:author', f'/user/{rng.choice(self.usernames)}')
+
+    def login(self, user, rng):
+        """
+        Log in through user_login with one of the load-test accounts
+        Starts from a fresh session so every run pays for a full login.
+        """
+        session = user.member
+        session.cookies.clear()
+        status, _ = session.post_form('login', '/login/', '/login/', {
+            'username': rng.choice(self.accounts), 'password': self.password,
+        })
+        return status == 302
+
+    def _ensure_logged_in(self, user, rng, attempts=3):
+        """
+        Log in if needed, backing off like a browser when the server sheds
+        the login (503) or throttles it (429) so posting and commenting are
+        not starved by a busy auth pool
+        """
+        if 'sessionid' in user.member.cookies:
+            return True
+        for _ in range(attempts):
+            if self.login(user, rng):
+                return True
+            if user.member.retry_after is None:
+                return False
+            try:
+                time.sleep(min(float(user.member.retry_after), 5))
+            except ValueError:
+                return False
+        return False
+
+    def post(self, user, rng):
+        """
+        Create a post through PostCreateView
+        """
+        if not self._ensure_logged_in(user, rng):
+            return
+        session = user.member
+        status, _ = session.post_form('post', '/post/new/', '/post/new/', {
+            'title': f'Load test post {rng.randint(0, 10 ** 6)}',
+            'content': 'Posted by the load-testing harness. ' * rng.randint(1, 20),
+        })
+        # CreateView redirects to the new post's get_absolute_url
+        match = re.search(r'/post/(\d+)/$', session.location or '') if status == 302 else None
+        if match:
+            with self.lock:
+                self.post_ids.append(int(match.group(1)))
+
+    def comment(self, user, rng):
+        """
+        Comment on a post through add_comment
+        """
+        post_id = self.random_post(rng)
+        if post_id is None or not self._ensure_logged_in(user, rng):
+            return
+        user.member.post_form('comment', f'/post/{post_id}/', f'/post/{post_id}/comment/', {
+            'content': f'Load test comment {rng.randint(0, 10 ** 6)}',
+        })
+
+
+def parse_mix(value):
+    """
+    Parse 'browse=70,comment=20' into {'browse': 70, 'comment': 20}
+    """
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f'Unknown scenario {name!r}')
+        mix[name] = float(weight)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('Scenario weights must add up to more than zero')
+    return mix
+
+
+# =============================================================================
+# RESULTS
+# =============================================================================
+
+class Recorder:
+    """
+    Thread-safe collector of per-request timings
+    Timings recorded before the warm-up period ends are discarded.
+    """
+    def __init__(self):
+        self.samples = []  # (name, seconds, status, error)
+        self.lock = threading.Lock()
+        self.recording = False
+
+    def record(self, name, seconds, status, error):
+        if self.recording:
+            with self.lock:
+                self.samples.append((name, seconds, status, error))
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list
+    The rank is fraction * n rounded up, so the p50 of 5 values is the 3rd.
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarise(samples, duration):
+    """
+    Turn raw samples into totals and per-request-name statistics
+    Latencies are reported in milliseconds.
+    """
+    def stats(group):
+        latencies = sorted(seconds * 1000 for _, seconds, _, _ in group)
+        errors = sum(1 for *_, error in group if error)
+        return {
+            'requests': len(group),
+            'errors': errors,
+            'error_rate': errors / len(group) if group else 0.0,
+            'rps': len(group) / duration if duration else 0.0,
+            'latency_ms': {
+                'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+                'p50': percentile(latencies, 0.50),
+                'p90': percentile(latencies, 0.90),
+                'p99': percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else 0.0,
+            },
+        }
+
+    by_name = {}
+    for sample in samples:
+        by_name.setdefault(sample[0], []).append(sample)
+    error_kinds = {}
+    for *_, error in samples:
+        if error:
+            error_kinds[error] = error_kinds.get(error, 0) + 1
+    return {
+        'total': stats(samples),
+        'requests': {name: stats(group) for name, group in sorted(by_name.items())},
+        'error_kinds': error_kinds,
+    }
+
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+
+def run_load(base_url, scenarios, mix, concurrency, duration, warmup=0, seed=None):
+    """
+    Replay the scenario mix with concurrent virtual users and return a summary
+    Each virtual user is a thread with its own session (cookies, keep-alive
+    connection) that picks a weighted-random scenario, runs it, and repeats
+    until the time is up.
+    """
+    recorder = Recorder()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    stop = threading.Event()
+
+    def virtual_user(number):
+        rng = random.Random(None if seed is None else seed + number)
+        user = VirtualUser(base_url, recorder)
+        try:
+            while not stop.is_set():
+                getattr(scenarios, rng.choices(names, weights)[0])(user, rng)
+        finally:
+            user.close()
+
+    threads = [threading.Thread(target=virtual_user, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    time.sleep(duration)
+    recorder.recording = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+    return summarise(recorder.samples, elapsed)
+
+
+def compare(current, previous):
+    """
+    Lines describing how a run differs from a previously saved one
+    """
+    def change(new, old):
+        return f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+
+    now, before = current['results']['total'], previous['results']['total']
+    lines = [
+        f'RPS:        {before["rps"]:.1f} -> {now["rps"]:.1f} ({change(now["rps"], before["rps"])})',
+        f'p50 ms:     {before["latency_ms"]["p50"]:.1f} -> {now["latency_ms"]["p50"]:.1f} '
+        f'({change(now["latency_ms"]["p50"], before["latency_ms"]["p50"])})',
+        f'p99 ms:     {before["latency_ms"]["p99"]:.1f} -> {now["latency_ms"]["p99"]:.1f} '
+        f'({change(now["latency_ms"]["p99"], before["latency_ms"]["p99"])})',
+        f'Error rate: {before["error_rate"]:.2%} -> {now["error_rate"]:.2%}',
+    ]
+    return lines
+
+
+def write_results(path, config, results):
+    """
+    Save a run as JSON so later runs can be compared against it
+    """
+    with open(path, 'w') as handle:
+        json.dump({'config': config, 'results': results}, handle, indent=2, sort_keys=True)
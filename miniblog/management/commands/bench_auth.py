@@ -0,0 +1,161 @@
+# Import standard library tools for the simulated server
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Import Django management command and test utilities
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from miniblog.loadtest import percentile
+from miniblog.models import Post
+
+BENCH_PASSWORD = 'bench-password-0451'
+
+
+class Command(BaseCommand):
+    """
+    Benchmark login throughput alongside page-view latency
+    Simulates a server with a fixed number of worker threads. Auth clients
+    hammer user_login while readers load the post list, and the command
+    reports successful logins per second, how many were shed or throttled,
+    and the latency readers saw. Each hasher profile is run with hashing
+    inline in the request thread and through the auth guard.
+    Runs against a throwaway copy of the database.
+    Usage: python manage.py bench_auth --profiles pbkdf2,scrypt --server-threads 8
+    """
+    help = 'Measure auth requests per second and read latency under password-hashing load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='pbkdf2,scrypt',
+                            help='Comma-separated PASSWORD_HASHER_PROFILES to compare')
+        parser.add_argument('--server-threads', type=int, default=8,
+                            help='Worker threads of the simulated server')
+        parser.add_argument('--auth-clients', type=int, default=16,
+                            help='Concurrent clients logging in')
+        parser.add_argument('--readers', type=int, default=4,
+                            help='Concurrent clients loading the post list')
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Seconds per run')
+        parser.add_argument('--throttle', action='store_true',
+                            help='Keep the per-IP and per-account throttles on (off by default)')
+
+    def handle(self, *args, **options):
+        profiles = [name.strip() for name in options['profiles'].split(',') if name.strip()]
+        unknown = [name for name in profiles if name not in settings.PASSWORD_HASHER_PROFILES]
+        if unknown:
+            raise CommandError(f'Unknown hasher profile(s): {", ".join(unknown)}')
+
+        # Work on a throwaway database file so benchmark accounts never touch real data
+        database = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False).name
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Shed and throttled requests are expected here - don't log each one
+        request_logger = logging.getLogger('django.request')
+        old_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            self.seed()
+            self.stdout.write(
+                f'{"profile":<10}{"mode":<9}{"logins/s":>10}{"shed":>7}{"thrott.":>9}'
+                f'{"read/s":>9}{"read p50":>10}{"read p99":>10}'
+            )
+            for profile in profiles:
+                for mode in ('inline', 'guarded'):
+                    result = self.run_profile(profile, mode, options)
+                    if result is None:
+                        self.stdout.write(f'{profile:<10}{mode:<9}  skipped - hasher not installed')
+                        continue
+                    self.stdout.write(
+                        f'{profile:<10}{mode:<9}{result["logins"]:>10.1f}{result["shed"]:>7}'
+                        f'{result["throttled"]:>9}{result["reads"]:>9.1f}'
+                        f'{result["read_p50"]:>8.1f}ms{result["read_p99"]:>8.1f}ms'
+                    )
+        finally:
+            request_logger.setLevel(old_level)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if os.path.exists(database):
+                os.remove(database)
+
+    def seed(self):
+        author = User.objects.create(username='bench-author')
+        Post.objects.bulk_create(
+            Post(title=f'Benchmark post {n}', content='Benchmark content. ' * 40, author=author)
+            for n in range(20)
+        )
+        User.objects.bulk_create(User(username=f'bench-{n}') for n in range(50))
+
+    def run_profile(self, profile, mode, options):
+        overrides = {
+            'PASSWORD_HASHERS': settings.PASSWORD_HASHER_PROFILES[profile],
+            'AUTH_HASH_WORKERS': settings.AUTH_HASH_WORKERS if mode == 'guarded' else 0,
+        }
+        if not options['throttle']:
+            overrides.update(AUTH_THROTTLE_IP=None, AUTH_THROTTLE_ACCOUNT=None)
+
+        with override_settings(**overrides):
+            try:
+                password = make_password(BENCH_PASSWORD)
+            except ValueError:
+                return None  # e.g. argon2-cffi not installed
+            User.objects.filter(username__startswith='bench-').update(password=password)
+            return self.measure(options)
+
+    def measure(self, options):
+        """
+        Drive the simulated server until the duration has passed
+        Every request is submitted to a shared pool of server threads, so the
+        latency readers see includes waiting behind auth requests for a thread.
+        """
+        server = ThreadPoolExecutor(max_workers=options['server_threads'])
+        stop = threading.Event()
+        lock = threading.Lock()
+        statuses = []
+        read_latencies = []
+
+        def login(number):
+            client = Client(HTTP_HOST='localhost')
+            data = {'username': f'bench-{number % 50}', 'password': BENCH_PASSWORD}
+            while not stop.is_set():
+                response = server.submit(client.post, '/login/', data).result()
+                client.cookies.clear()
+                with lock:
+                    statuses.append(response.status_code)
+
+        def read():
+            client = Client(HTTP_HOST='localhost')
+            while not stop.is_set():
+                started = time.perf_counter()
+                server.submit(client.get, '/').result()
+                with lock:
+                    read_latencies.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=login, args=(n,)) for n in range(options['auth_clients'])]
+        threads += [threading.Thread(target=read) for _ in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        server.shutdown()
+
+        latencies = sorted(seconds * 1000 for seconds in read_latencies)
+        return {
+            'logins': statuses.count(302) / elapsed,
+            'shed': statuses.count(503),
+            'throttled': statuses.count(429),
+            'reads': len(latencies) / elapsed,
+            'read_p50': percentile(latencies, 0.50),
+            'read_p99': percentile(latencies, 0.99),
+        }
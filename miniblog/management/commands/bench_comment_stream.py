@@ -0,0 +1,134 @@
+# Import standard library tools for timing concurrent connections
+import asyncio
+import statistics
+import threading
+import time
+
+# Import Django management command utilities
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from miniblog.events import get_broker
+from miniblog.models import Post
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the live comment stream with many concurrent subscribers
+    Opens N Server-Sent Events connections against config.asgi.application
+    in-process (no network), publishes comments from a worker thread the way
+    add_comment does, and reports how long fan-out takes to reach everyone.
+    Usage: python manage.py bench_comment_stream --subscribers 5000
+    """
+    help = 'Measure comment fan-out latency across many concurrent SSE subscribers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=1000,
+                            help='Number of concurrent stream connections')
+        parser.add_argument('--messages', type=int, default=20,
+                            help='Number of comments to publish')
+        parser.add_argument('--post', type=int,
+                            help='Post id to subscribe to (defaults to the newest post)')
+
+    def handle(self, *args, **options):
+        if options['post'] is not None:
+            post = Post.objects.filter(pk=options['post']).first()
+        else:
+            post = Post.objects.order_by('-pk').first()
+        if post is None:
+            raise CommandError('No post to subscribe to - create one first.')
+
+        # Import here so the ASGI application is built after settings are ready
+        from config.asgi import application
+
+        path = reverse('comment-stream', kwargs={'pk': post.pk})
+        results = asyncio.run(self.run(application, path, post.pk, options['subscribers'], options['messages']))
+        self.report(results, options['subscribers'], options['messages'])
+
+    async def run(self, application, path, post_id, subscriber_count, message_count):
+        broker = get_broker()
+        received = {}  # message id -> list of arrival times
+        opened = 0  # connections that have sent their response headers
+        disconnect = asyncio.Event()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'root_path': '', 'query_string': b'', 'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+
+        async def connection():
+            request_sent = False
+
+            async def receive():
+                # First the (empty) request body, then wait until told to hang up
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                nonlocal opened
+                if message['type'] == 'http.response.start':
+                    opened += 1
+                    return
+                now = time.perf_counter()
+                for line in message['body'].decode().splitlines():
+                    if line.startswith('id: '):
+                        received.setdefault(int(line[4:]), []).append(now)
+
+            await application(dict(scope), receive, send)
+
+        threads_before = threading.active_count()
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(connection()) for _ in range(subscriber_count)]
+
+        # Wait until every connection is open and listening
+        channel = f'post:{post_id}'
+        while opened < subscriber_count:
+            await asyncio.sleep(0.01)
+        connect_time = time.perf_counter() - started
+        threads_idle = threading.active_count()
+
+        # Publish from another thread, as add_comment does under a real server
+        published = {}
+        base_id = 10 ** 9  # Above any real comment id so nothing is skipped
+        for n in range(message_count):
+            message_id = base_id + n
+            message = {'id': message_id, 'post': post_id, 'author': 'bench',
+                       'content': 'benchmark comment', 'date': ''}
+            published[message_id] = time.perf_counter()
+            await asyncio.to_thread(broker.publish, channel, message)
+            while len(received.get(message_id, ())) < subscriber_count:
+                await asyncio.sleep(0.001)
+
+        disconnect.set()
+        await asyncio.gather(*tasks)
+
+        return {
+            'connect_time': connect_time,
+            'threads_before': threads_before,
+            'threads_idle': threads_idle,
+            'fanout': [max(received[i]) - published[i] for i in published],
+            'delivery': [t - published[i] for i in published for t in received[i]],
+            'leftover': broker.subscriber_count(channel),
+        }
+
+    def report(self, results, subscriber_count, message_count):
+        def ms(seconds):
+            # Format a duration in milliseconds
+            return f'{seconds * 1000:.2f} ms'
+
+        delivery = sorted(results['delivery'])
+        fanout = results['fanout']
+        self.stdout.write(f'Subscribers:          {subscriber_count}')
+        self.stdout.write(f'Messages:             {message_count}')
+        self.stdout.write(f'Connect all:          {ms(results["connect_time"])}')
+        self.stdout.write(f'Threads before/idle:  {results["threads_before"]} / {results["threads_idle"]}')
+        self.stdout.write(f'Fan-out (all subs):   median {ms(statistics.median(fanout))}, max {ms(max(fanout))}')
+        self.stdout.write(f'Per delivery:         p50 {ms(delivery[len(delivery) // 2])}, '
+                          f'p99 {ms(delivery[int(len(delivery) * 0.99) - 1])}')
+        self.stdout.write(f'Deliveries/second:    {len(delivery) / sum(fanout):.0f}')
+        self.stdout.write(f'Subscribers left:     {results["leftover"]}')
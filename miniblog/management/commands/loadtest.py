@@ -0,0 +1,205 @@
+# Import standard library tools
+import json
+
+# Import Django management command utilities
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from miniblog import loadtest
+from miniblog.models import Post
+
+# Accounts created for the run - the ones this run created are deleted
+# afterwards along with their posts and comments
+ACCOUNT_PREFIX = 'loadtest-'
+ACCOUNT_PASSWORD = 'loadtest-password-0451'
+
+
+class Command(BaseCommand):
+    """
+    Load-test the site under a WSGI or ASGI server
+    Boots config.wsgi.application or config.asgi.application under the chosen
+    server and worker count, replays a weighted mix of anonymous browsing,
+    logging in, posting and commenting, then reports requests per second,
+    latency percentiles and error rates.
+    The load-test accounts and the post/user lists the scenarios visit come
+    from this project's database, so --url must point at a server using
+    that same database - a remote deployment would reject every login.
+    Booted servers run with DEBUG and the login throttles off
+    (config/loadtest_settings.py); --throttle keeps the throttles on. A
+    server given with --url keeps its own settings.
+    Usage:
+        python manage.py loadtest --server gunicorn --workers 4 --output wsgi.json
+        python manage.py loadtest --server uvicorn --workers 4 --compare wsgi.json
+    """
+    help = 'Replay a weighted mix of user scenarios against the site and report throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', default='gunicorn', choices=sorted(loadtest.SERVERS),
+                            help='Server to boot the app under (default: gunicorn)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Server worker processes')
+        parser.add_argument('--url',
+                            help='Test an already running server at this base URL instead of booting one. '
+                                 'It must use this project\'s database, where the accounts are created')
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Number of simulated users')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds to measure for')
+        parser.add_argument('--warmup', type=float, default=5,
+                            help='Seconds of traffic before measuring starts')
+        parser.add_argument('--mix', default=','.join(f'{k}={v}' for k, v in loadtest.DEFAULT_MIX.items()),
+                            help='Scenario weights, e.g. browse=70,login=5,post=5,comment=20')
+        parser.add_argument('--accounts', type=int, default=10,
+                            help='Number of load-test accounts to log in with')
+        parser.add_argument('--seed', type=int,
+                            help='Random seed for a repeatable scenario sequence')
+        parser.add_argument('--output',
+                            help='Write the results as JSON to this file')
+        parser.add_argument('--compare',
+                            help='JSON file from an earlier run to compare against')
+        parser.add_argument('--keep-data', action='store_true',
+                            help='Keep the load-test accounts and everything they posted')
+        parser.add_argument('--throttle', action='store_true',
+                            help='Keep the login throttles on in the booted server (off by default)')
+        parser.add_argument('--force', action='store_true',
+                            help='Reuse load-test accounts that already exist, resetting their passwords')
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options['mix'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as handle:
+                previous = json.load(handle)
+
+        accounts, created = self.create_accounts(options['accounts'], options['force'])
+        try:
+            scenarios = loadtest.Scenarios(
+                post_ids=Post.objects.order_by('-pk').values_list('pk', flat=True)[:200],
+                usernames=User.objects.filter(post__isnull=False).distinct()
+                .values_list('username', flat=True)[:200],
+                accounts=accounts,
+                password=ACCOUNT_PASSWORD,
+            )
+            if options['url']:
+                results = self.run(options['url'].rstrip('/'), scenarios, mix, options)
+            else:
+                port = loadtest.free_port()
+                try:
+                    command = loadtest.server_command(options['server'], port, options['workers'])
+                except ValueError as exc:
+                    raise CommandError(exc)
+                self.stdout.write(f'Starting {options["server"]} with {options["workers"]} worker(s) on port {port}')
+                try:
+                    # Production-like settings with the login throttles off, since all
+                    # virtual users share one address and a few accounts - see
+                    # config/loadtest_settings.py
+                    env = {'DJANGO_SETTINGS_MODULE': 'config.loadtest_settings',
+                           'LOADTEST_THROTTLE': '1' if options['throttle'] else ''}
+                    with loadtest.ServerProcess(command, port, cwd=settings.BASE_DIR,
+                                               quiet=options['verbosity'] < 2, env=env):
+                        results = self.run(f'http://127.0.0.1:{port}', scenarios, mix, options)
+                except RuntimeError as exc:
+                    raise CommandError(exc)
+        finally:
+            # Only delete what this run created - never pre-existing users
+            if not options['keep_data']:
+                User.objects.filter(pk__in=created).delete()
+
+        config = {
+            'server': None if options['url'] else options['server'],
+            'url': options['url'],
+            'workers': options['workers'],
+            'concurrency': options['concurrency'],
+            'duration': options['duration'],
+            'warmup': options['warmup'],
+            'mix': mix,
+            'seed': options['seed'],
+            'throttle': options['throttle'],
+        }
+        self.report(results)
+        if options['output']:
+            loadtest.write_results(options['output'], config, results)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if previous is not None:
+            self.stdout.write('')
+            self.stdout.write(f'Compared with {options["compare"]}:')
+            for line in loadtest.compare({'config': config, 'results': results}, previous):
+                self.stdout.write(f'  {line}')
+
+    def create_accounts(self, count, force):
+        """
+        Create the accounts virtual users log in with
+        Returns (usernames, pks of the users created by this run). Accounts
+        that already exist are only reused - with their password reset -
+        when force is set. The password is hashed once and shared, so setup
+        does not pay for one PBKDF2 run per account.
+        """
+        password = make_password(ACCOUNT_PASSWORD)
+        usernames = [f'{ACCOUNT_PREFIX}{n}' for n in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        if existing and not force:
+            raise CommandError(
+                f'{len(existing)} load-test account(s) already exist (e.g. {min(existing)}). '
+                'Use --force to reuse them and reset their passwords.'
+            )
+        User.objects.filter(username__in=existing).update(password=password)
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in usernames if name not in existing]
+        )
+        created = list(
+            User.objects.filter(username__in=set(usernames) - existing).values_list('pk', flat=True)
+        )
+
+        # Browsing and commenting need at least one post to visit; it is
+        # written by a created account, so teardown removes it as well
+        if not Post.objects.exists():
+            if not created:
+                raise CommandError('The database has no posts to visit and no new account to seed one with.')
+            Post.objects.create(
+                title='Load test seed post', content='Created by the loadtest command.',
+                author_id=created[0],
+            )
+        return usernames, created
+
+    def run(self, base_url, scenarios, mix, options):
+        self.stdout.write(
+            f'Running {options["concurrency"]} users for {options["duration"]}s '
+            f'(+{options["warmup"]}s warm-up) against {base_url}'
+        )
+        return loadtest.run_load(
+            base_url, scenarios, mix,
+            concurrency=options['concurrency'],
+            duration=options['duration'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+        )
+
+    def report(self, results):
+        total = results['total']
+        latency = total['latency_ms']
+        self.stdout.write('')
+        self.stdout.write(f'Requests:    {total["requests"]} ({total["rps"]:.1f}/s)')
+        self.stdout.write(f'Errors:      {total["errors"]} ({total["error_rate"]:.2%})')
+        self.stdout.write(
+            f'Latency ms:  p50 {latency["p50"]:.1f}  p90 {latency["p90"]:.1f}  '
+            f'p99 {latency["p99"]:.1f}  max {latency["max"]:.1f}'
+        )
+        self.stdout.write('')
+        self.stdout.write(f'{"request":<18}{"count":>8}{"rps":>9}{"err%":>8}{"p50":>9}{"p90":>9}{"p99":>9}')
+        for name, stats in results['requests'].items():
+            latency = stats['latency_ms']
+            self.stdout.write(
+                f'{name:<18}{stats["requests"]:>8}{stats["rps"]:>9.1f}{stats["error_rate"] * 100:>7.1f}%'
+                f'{latency["p50"]:>9.1f}{latency["p90"]:>9.1f}{latency["p99"]:>9.1f}'
+            )
+        if results['error_kinds']:
+            self.stdout.write('')
+            self.stdout.write('Errors by kind: ' + ', '.join(
+                f'{kind} x{count}' for kind, count in sorted(results['error_kinds'].items())
+            ))
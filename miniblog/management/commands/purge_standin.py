@@ -0,0 +1,68 @@
+# Import standard library tools for the stand-in HTTP server
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Import Django management command utilities
+from django.core.management.base import BaseCommand
+
+
+class PurgeStandInHandler(BaseHTTPRequestHandler):
+    """
+    Minimal purge endpoint that accepts what HTTPPurger sends
+    Stands in for the real proxy while developing.
+    """
+    def do_POST(self):
+        keys = self.headers.get('Surrogate-Key', '').split()
+        self.server.purged.append(keys)
+        body = json.dumps({'status': 'ok', 'purged': keys}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_PURGE = do_POST
+
+    def log_message(self, format, *args):
+        # The command prints each purge itself; skip the access log
+        pass
+
+
+def purge_standin_server(host='127.0.0.1', port=8081):
+    """
+    Build (but do not start) a stand-in purge server
+    Purged key lists are collected in server.purged.
+    """
+    server = ThreadingHTTPServer((host, port), PurgeStandInHandler)
+    server.purged = []
+    return server
+
+
+class Command(BaseCommand):
+    """
+    Run a local stand-in for the caching proxy's purge API
+    Accepts the POSTs HTTPPurger sends and prints the keys in each one,
+    so purges can be watched while developing without a real proxy.
+    Usage: python manage.py purge_standin --port 8081
+    """
+    help = 'Serve a local purge endpoint that prints every surrogate-key purge it receives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+        parser.add_argument('--port', type=int, default=8081, help='Port to listen on')
+
+    def handle(self, *args, **options):
+        server = purge_standin_server(options['host'], options['port'])
+        self.stdout.write(f'Purge stand-in listening on http://{options["host"]}:{options["port"]}/ (Ctrl+C to stop)')
+        seen = 0
+        server.timeout = 0.5
+        try:
+            while True:
+                server.handle_request()
+                for keys in server.purged[seen:]:
+                    self.stdout.write(f'PURGE {" ".join(keys)}')
+                seen = len(server.purged)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,71 @@
+# Import Django management command utilities
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from miniblog import warmup
+
+
+class Command(BaseCommand):
+    """
+    Warm up the app, or profile how long a fresh worker takes to start
+    Without options it runs the same warm-up the gunicorn master runs before
+    forking (config/gunicorn.conf.py) and prints the time of each step.
+    With --profile it starts fresh Python processes, once cold and once
+    warmed up, and reports import time per module plus what the first
+    request to each URL cost compared with a repeat request.
+    Usage:
+        python manage.py warmup
+        python manage.py warmup --profile --url / --url /about/
+    """
+    help = 'Run the worker warm-up, or report where a fresh worker spends its startup time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='store_true',
+                            help='Profile the startup of fresh processes instead of warming this one')
+        parser.add_argument('--url', action='append', dest='urls',
+                            help='URL whose first request is timed (repeatable, default: WARMUP_URLS)')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Number of modules to list in the import report')
+
+    def handle(self, *args, **options):
+        if not options['profile']:
+            self.report_steps(warmup.warm_up())
+            return
+
+        urls = options['urls'] or settings.WARMUP_URLS
+        try:
+            cold = warmup.profile_startup(False, urls, cwd=settings.BASE_DIR)
+            warm = warmup.profile_startup(True, urls, cwd=settings.BASE_DIR)
+        except RuntimeError as exc:
+            raise CommandError(exc)
+
+        self.report_imports(cold['imports'], options['top'])
+        self.stdout.write('')
+        self.stdout.write(f'App load (import config.wsgi): {cold["app_load_ms"]:.1f}ms')
+        self.stdout.write('')
+        self.stdout.write('Warm-up steps:')
+        self.report_steps(warm['warm_up'])
+        self.stdout.write('')
+        self.stdout.write(f'{"first request":<28}{"status":>7}{"cold":>10}{"warmed":>10}{"repeat":>10}')
+        for before, after in zip(cold['requests'], warm['requests']):
+            self.stdout.write(
+                f'{before["url"]:<28}{before["status"]:>7}{before["first_ms"]:>8.1f}ms'
+                f'{after["first_ms"]:>8.1f}ms{before["repeat_ms"]:>8.1f}ms'
+            )
+
+    def report_steps(self, steps):
+        for step in steps:
+            self.stdout.write(f'  {step["step"]:<14}{step["ms"]:>8.1f}ms  {step["detail"]}')
+        self.stdout.write(f'  {"total":<14}{sum(step["ms"] for step in steps):>8.1f}ms')
+
+    def report_imports(self, imports, top):
+        total = sum(entry['self_ms'] for entry in imports)
+        self.stdout.write(f'Import time: {total:.1f}ms across {len(imports)} modules')
+        self.stdout.write('')
+        self.stdout.write(f'{"package":<40}{"self":>10}')
+        for package, milliseconds in warmup.summarise_imports(imports)[:top]:
+            self.stdout.write(f'{package:<40}{milliseconds:>8.1f}ms')
+        self.stdout.write('')
+        self.stdout.write(f'{"slowest modules":<40}{"self":>10}{"cumulative":>12}')
+        for entry in sorted(imports, key=lambda entry: entry['self_ms'], reverse=True)[:top]:
+            self.stdout.write(f'{entry["module"]:<40}{entry["self_ms"]:>8.1f}ms{entry["cumulative_ms"]:>10.1f}ms')
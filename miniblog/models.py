@@ -1,11 +1,53 @@
 # Import Django's database models and utilities
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F               # Database-side arithmetic for counters
 from django.contrib.auth.models import User  # Django's built-in User model
 from django.urls import reverse              # For generating URLs
 from django.utils import timezone            # For timezone-aware datetime
+from django.utils.text import slugify        # Turns "Django Tips" into "django-tips"
+from .surrogate_keys import POST_LIST_KEY, purge_keys, tag_list_key  # Cache purging
 
 # Database Models - These define the structure of our database tables
 
+class Tag(models.Model):
+    """
+    Tag model - a label readers can browse posts by
+    post_count is kept up to date as posts are tagged, untagged and deleted,
+    so the tag cloud never has to COUNT the through table.
+    """
+    # Display name as the author typed it
+    name = models.CharField(max_length=50)
+    
+    # URL-safe, unique version of the name used in /tag/<slug>/
+    slug = models.SlugField(max_length=50, unique=True)
+    
+    # Number of posts carrying this tag (maintained incrementally)
+    post_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            # Tag cloud picks the most used tags
+            models.Index(fields=['-post_count'], name='tag_post_count_idx'),
+        ]
+    
+    def __str__(self):
+        return self.name
+    
+    def get_absolute_url(self):
+        """
+        Returns the URL listing posts with this tag
+        """
+        return reverse('tag-posts', kwargs={'slug': self.slug})
+    
+    @staticmethod
+    def make_slug(name):
+        """
+        The slug a typed tag name is stored under
+        Empty for names without any a-z or 0-9 character, e.g. "++"
+        """
+        return slugify(name.strip()[:50])
+
 class Post(models.Model):
     """
     Blog Post model - represents a single blog post
@@ -25,6 +67,9 @@ class Post(models.Model):
     # null=True allows posts without an author (for data migration)
     author = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     
+    # Tags attached to this post - edit through set_tags() so counts stay right
+    tags = models.ManyToManyField(Tag, through='PostTag', related_name='posts', blank=True)
+    
     def __str__(self):
         """
         String representation of the Post object
@@ -38,6 +83,78 @@ class Post(models.Model):
         Django will redirect here after creating/updating a post
         """
         return reverse('post-detail', kwargs={'pk': self.pk})
+    
+    def save(self, *args, **kwargs):
+        """
+        Keep the post date copied onto this post's tag rows in step
+        """
+        adding = self._state.adding  # New posts have no tag rows yet
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if not adding and (update_fields is None or 'date_posted' in update_fields):
+            PostTag.objects.filter(post=self).exclude(date_posted=self.date_posted) \
+                .update(date_posted=self.date_posted)
+    
+    def set_tags(self, names):
+        """
+        Replace this post's tags with the given tag names
+        Unknown names create new tags. Only the difference from the current
+        tags is written, and each affected tag's post_count is adjusted in
+        the same transaction.
+        """
+        # Deduplicate by slug, keeping the first spelling of each name.
+        # PostForm.clean_tags rejects names that would be cut short, dropped or merged here.
+        wanted = {}
+        for name in names:
+            name = name.strip()[:50]
+            slug = Tag.make_slug(name)
+            if slug:
+                wanted.setdefault(slug, name)
+        
+        with transaction.atomic():
+            # ignore_conflicts copes with two posts creating the same tag at once
+            Tag.objects.bulk_create(
+                [Tag(name=name, slug=slug) for slug, name in wanted.items()],
+                ignore_conflicts=True,
+            )
+            wanted_ids = set(Tag.objects.filter(slug__in=wanted).values_list('pk', flat=True))
+            current_ids = set(PostTag.objects.filter(post=self).values_list('tag_id', flat=True))
+            added = wanted_ids - current_ids
+            removed = current_ids - wanted_ids
+            
+            if removed:
+                PostTag.objects.filter(post=self, tag_id__in=removed).delete()
+                Tag.objects.filter(pk__in=removed).update(post_count=F('post_count') - 1)
+            if added:
+                PostTag.objects.bulk_create(
+                    PostTag(post=self, tag_id=tag_id, date_posted=self.date_posted) for tag_id in added
+                )
+                Tag.objects.filter(pk__in=added).update(post_count=F('post_count') + 1)
+            
+            # Refresh the changed tags' pages and the tag cloud on the home page
+            if added or removed:
+                purge_keys({POST_LIST_KEY} | {tag_list_key(tag_id) for tag_id in added | removed})
+
+class PostTag(models.Model):
+    """
+    Through table linking posts and tags
+    Carries a copy of the post's date so /tag/<slug>/ can read a page of
+    posts straight off the (tag, date) index without sorting the whole tag.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+    
+    # Copy of post.date_posted, kept in step by Post.save()
+    date_posted = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'tag'], name='unique_post_tag'),
+        ]
+        indexes = [
+            # Newest posts for a tag first; post is included so the index covers the scan
+            models.Index(fields=['tag', '-date_posted', '-post'], name='posttag_tag_date_idx'),
+        ]
 
 class Comment(models.Model):
     """
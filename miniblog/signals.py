@@ -0,0 +1,106 @@
+# Import Django's signal tools
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Comment, Post, Tag
+from .surrogate_keys import (
+    SITEMAP_KEY, author_key, author_list_key, comments_key, post_key, post_keys, purge_keys, tag_key,
+    tag_list_key,
+)
+
+# Signal handlers - keep denormalised data right when rows change outside
+# the normal views (admin actions, cascades from deleting a user, etc.)
+
+
+@receiver(pre_delete, sender=Post)
+def release_post_tags(sender, instance, **kwargs):
+    """
+    Decrement the post_count of every tag on a post that is being deleted
+    Runs before the cascade removes the post's PostTag rows, which is also
+    the last chance to find out which tag pages need purging.
+    """
+    tags = Tag.objects.filter(posttag__post=instance)
+    purge_keys(tag_list_key(tag_id) for tag_id in tags.values_list('pk', flat=True))
+    tags.update(post_count=F('post_count') - 1)
+
+
+# Cache purging - tell the fronting proxy which pages went stale.
+# Listing pages carry the key of every post shown on them, so purging a
+# post's key also refreshes each listing it appears on. Listing keys are
+# only needed when a list gains or loses a post, or its order changes.
+
+@receiver(pre_save, sender=Post)
+def remember_listing_fields(sender, instance, **kwargs):
+    """
+    Note the stored author and date of a post about to be updated
+    They decide which listings the post sits on and where.
+    """
+    if not instance._state.adding:
+        instance._stored_listing = Post.objects.filter(pk=instance.pk) \
+            .values_list('author_id', 'date_posted').first()
+
+
+@receiver(post_save, sender=Post)
+def purge_saved_post(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored_listing', None)
+    if created or stored is None:
+        purge_keys(post_keys(instance))
+    elif stored != (instance.author_id, instance.date_posted):
+        # Moved to another author or re-dated - every listing it is on changes
+        stale = post_keys(instance) | {tag_list_key(pk) for pk in instance.tags.values_list('pk', flat=True)}
+        if stored[0]:
+            stale.add(author_list_key(stored[0]))
+        purge_keys(stale)
+    else:
+        # A plain edit - the pages showing the post all carry its key
+        purge_keys({post_key(instance.pk)})
+
+
+@receiver(post_delete, sender=Post)
+def purge_deleted_post(sender, instance, **kwargs):
+    purge_keys(post_keys(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment(sender, instance, **kwargs):
+    purge_keys({comments_key(instance.post_id)})
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def purge_tag(sender, instance, **kwargs):
+    """
+    Purge every page showing a tag's name or linking to its slug
+    e.g. after a rename in the admin
+    """
+    purge_keys({tag_key(instance.pk), tag_list_key(instance.pk)})
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    """
+    Note the stored username of a user about to be updated
+    Author sitemap shards and the /user/<username> page are built from it.
+    """
+    if not instance._state.adding and (update_fields is None or 'username' in update_fields):
+        instance._stored_username = User.objects.filter(pk=instance.pk) \
+            .values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def purge_author(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Purge pages showing a user's name when the user is edited
+    Logins save last_login alone, so those are skipped.
+    """
+    if created or not (update_fields is None or 'username' in update_fields):
+        return
+    stale = {author_key(instance.pk)}
+    stored = getattr(instance, '_stored_username', None)
+    if stored is not None and stored != instance.username:
+        # Renamed - the author sitemap shards and the user's posts page hold the old name
+        stale |= {SITEMAP_KEY, author_list_key(instance.pk)}
+    purge_keys(stale)
@@ -0,0 +1,259 @@
+# Import standard library helpers for building XML
+import hashlib
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+# Import Django utilities
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, DateTimeField, DurationField, ExpressionWrapper, F, Max, Min, Sum, Value
+from django.urls import reverse
+
+from .models import Post
+
+# Sitemaps - give crawlers every post and author page without walking
+# ?page=N on the post list, which costs the database a deep OFFSET scan.
+#
+# Posts are split into shards by primary key range: shard 0 holds ids
+# 1..SIZE, shard 1 holds SIZE+1..2*SIZE and so on. Each shard is read with
+# keyset pagination (WHERE id > last_seen ORDER BY id LIMIT batch), so the
+# cost of a shard never depends on how deep into the table it sits. Author
+# pages are sharded the same way by user id.
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+# Seconds since 1970 for a date column, as a database expression. Summed over
+# a shard it changes whenever any row's date moves, whatever the row order.
+EPOCH = Value(datetime(1970, 1, 1, tzinfo=timezone.utc), output_field=DateTimeField())
+
+
+def shard_size():
+    """
+    Number of URLs per child sitemap (the protocol allows at most 50,000)
+    """
+    return getattr(settings, 'SITEMAP_SHARD_SIZE', 5000)
+
+
+def batch_size():
+    """
+    Number of rows fetched per keyset query while streaming a shard
+    """
+    return getattr(settings, 'SITEMAP_BATCH_SIZE', 500)
+
+
+def shard_bounds(shard):
+    """
+    Inclusive (low, high) id range covered by a shard
+    """
+    size = shard_size()
+    return shard * size + 1, (shard + 1) * size
+
+
+def format_lastmod(value):
+    """
+    W3C datetime used by the sitemap protocol
+    """
+    return value.isoformat(timespec='seconds')
+
+
+def _url_entry(location, lastmod):
+    return f'<url><loc>{escape(location)}</loc><lastmod>{format_lastmod(lastmod)}</lastmod></url>\n'
+
+
+# =============================================================================
+# SECTIONS
+# =============================================================================
+
+class PostSection:
+    """
+    Every post detail page, sharded by post id
+    """
+    name = 'posts'
+    url_name = 'sitemap-posts'
+
+    def shards(self):
+        """
+        One grouped query returning {shard: lastmod} for shards that have posts
+        """
+        rows = Post.objects.annotate(shard=(F('pk') - 1) / shard_size()) \
+            .values('shard').annotate(lastmod=Max('date_posted')).order_by('shard')
+        return {row['shard']: row['lastmod'] for row in rows}
+
+    def fingerprint(self, shard):
+        """
+        Summary of a shard's contents - changes whenever a post is added to,
+        removed from, or re-dated within the shard's id range
+        The sum of every post's date catches a re-dated post that is not the
+        newest one, which Max('date_posted') alone would miss.
+        """
+        low, high = shard_bounds(shard)
+        return Post.objects.filter(pk__range=(low, high)).aggregate(
+            count=Count('pk'), first=Min('pk'), last=Max('pk'), lastmod=Max('date_posted'),
+            dates=Sum(ExpressionWrapper(F('date_posted') - EPOCH, output_field=DurationField())),
+        )
+
+    def entries(self, shard, base_url):
+        """
+        Yield <url> elements for a shard using keyset pagination
+        """
+        low, high = shard_bounds(shard)
+        last_seen = low - 1
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_seen, pk__lte=high)
+                .only('pk', 'date_posted').order_by('pk')[:batch_size()]
+            )
+            if not batch:
+                return
+            for post in batch:
+                yield _url_entry(base_url + post.get_absolute_url(), post.date_posted)
+            last_seen = batch[-1].pk
+
+
+class AuthorSection:
+    """
+    Every author's user-posts page, sharded by user id
+    lastmod is the date of the author's newest post
+    """
+    name = 'authors'
+    url_name = 'sitemap-authors'
+
+    def shards(self):
+        rows = Post.objects.filter(author__isnull=False) \
+            .annotate(shard=(F('author_id') - 1) / shard_size()) \
+            .values('shard').annotate(lastmod=Max('date_posted')).order_by('shard')
+        return {row['shard']: row['lastmod'] for row in rows}
+
+    def fingerprint(self, shard):
+        """
+        Summary of a shard's contents - changes when an author gains or loses
+        posts, and when an author in the shard is renamed (the URLs hold
+        usernames)
+        """
+        low, high = shard_bounds(shard)
+        summary = Post.objects.filter(author_id__gte=low, author_id__lte=high).aggregate(
+            count=Count('pk'), authors=Count('author_id', distinct=True),
+            lastmod=Max('date_posted'),
+        )
+        names = hashlib.md5()
+        usernames = User.objects.filter(pk__gte=low, pk__lte=high, post__isnull=False) \
+            .distinct().order_by('pk').values_list('username', flat=True)
+        for username in usernames.iterator():
+            names.update(username.encode() + b'\0')
+        summary['usernames'] = names.hexdigest()
+        return summary
+
+    def entries(self, shard, base_url):
+        low, high = shard_bounds(shard)
+        last_seen = low - 1
+        while True:
+            batch = list(
+                Post.objects.filter(author_id__gt=last_seen, author_id__lte=high)
+                .values('author_id', 'author__username')
+                .annotate(lastmod=Max('date_posted'))
+                .order_by('author_id')[:batch_size()]
+            )
+            if not batch:
+                return
+            for row in batch:
+                location = reverse('user-posts', kwargs={'username': row['author__username']})
+                yield _url_entry(base_url + location, row['lastmod'])
+            last_seen = batch[-1]['author_id']
+
+
+SECTIONS = {section.name: section for section in (PostSection(), AuthorSection())}
+
+
+# =============================================================================
+# DOCUMENTS
+# =============================================================================
+
+def index_entries(base_url):
+    """
+    List every non-empty child sitemap with its lastmod
+    The grouped queries behind this are cached briefly so crawlers fetching
+    the index repeatedly do not rescan the posts table each time.
+    """
+    timeout = getattr(settings, 'SITEMAP_INDEX_TIMEOUT', 300)
+    entries = []
+    for section in SECTIONS.values():
+        shards = cache.get_or_set(f'sitemap:index:{section.name}', section.shards, timeout)
+        for shard, lastmod in sorted(shards.items()):
+            location = base_url + reverse(section.url_name, kwargs={'shard': shard})
+            entries.append((location, lastmod))
+    return entries
+
+
+def render_index(base_url):
+    """
+    Build the sitemap index document
+    """
+    parts = [XML_HEADER, f'<sitemapindex xmlns="{SITEMAP_NS}">\n']
+    for location, lastmod in index_entries(base_url):
+        parts.append(f'<sitemap><loc>{escape(location)}</loc>'
+                     f'<lastmod>{format_lastmod(lastmod)}</lastmod></sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts)
+
+
+def shard_cache_key(section, shard, base_url, fingerprint):
+    """
+    Cache key for one rendered shard
+    It includes the shard's fingerprint, so a shard whose id range has not
+    changed keeps hitting the same entry and a changed one misses it.
+    """
+    digest = hashlib.md5(f'{base_url}|{sorted(fingerprint.items())}'.encode()).hexdigest()
+    return f'sitemap:{section.name}:{shard}:{digest}'
+
+
+def stream_shard(section, shard, base_url):
+    """
+    Return (cached_document, chunk_iterator) for a child sitemap
+    On a cache hit the first item is the stored document and the second is
+    None. On a miss the iterator streams the XML as it is read from the
+    database and stores the finished document in the cache at the end.
+    Returns (None, None) when the shard has no rows.
+    """
+    fingerprint = section.fingerprint(shard)
+    if not fingerprint['count']:
+        return None, None
+
+    key = shard_cache_key(section, shard, base_url, fingerprint)
+    document = cache.get(key)
+    if document is not None:
+        return document, None
+
+    def generate():
+        chunks = [XML_HEADER, f'<urlset xmlns="{SITEMAP_NS}">\n']
+        yield ''.join(chunks)
+        for entry in section.entries(shard, base_url):
+            chunks.append(entry)
+            yield entry
+        chunks.append('</urlset>\n')
+        yield chunks[-1]
+        # Only a fully streamed document is cached
+        cache.set(key, ''.join(chunks), getattr(settings, 'SITEMAP_CACHE_TIMEOUT', 60 * 60 * 24))
+
+    return None, generate()
+
+
+def render_robots(sitemap_url):
+    """
+    robots.txt pointing crawlers at the sitemap index
+    Paginated listings are disallowed because every post is reachable from
+    the sitemap, and deep ?page=N requests are the expensive ones.
+    """
+    lines = [
+        'User-agent: *',
+        'Disallow: /admin/',
+        'Disallow: /*?page=',
+        'Disallow: /*/comments/stream/',
+        'Disallow: /login/',
+        'Disallow: /register/',
+        'Disallow: /post/new/',
+        '',
+        f'Sitemap: {sitemap_url}',
+    ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,260 @@
+# Import standard library tools
+import contextvars
+import logging
+import queue
+import threading
+from collections import deque
+from functools import lru_cache
+
+# Import Django utilities
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Surrogate keys - let a reverse-proxy cache keep pages for a long time and
+# still drop exactly the ones that changed.
+#
+# Every response is labelled with the keys of what it shows: the posts on it,
+# their authors and tags, and the listing it belongs to. The labels go out in both
+# common header formats, Surrogate-Key (space separated) and Cache-Tag (comma
+# separated). When a post or comment is saved, the matching keys are sent to
+# a purger, which tells the proxy to drop every page carrying any of them.
+
+SITE_KEY = 'site'            # Every response - purging it empties the whole cache
+POST_LIST_KEY = 'posts'      # The home page listing
+SITEMAP_KEY = 'sitemap'      # sitemap.xml and its shards
+
+
+def post_key(post_id):
+    return f'post-{post_id}'
+
+
+def author_key(user_id):
+    return f'author-{user_id}'
+
+
+def author_list_key(user_id):
+    return f'posts-author-{user_id}'
+
+
+def tag_list_key(tag_id):
+    return f'posts-tag-{tag_id}'
+
+
+def tag_key(tag_id):
+    return f'tag-{tag_id}'
+
+
+def comments_key(post_id):
+    # Only the post's own page shows its comments
+    return f'comments-post-{post_id}'
+
+
+def post_keys(post):
+    """
+    Keys to purge when a post is added to or removed from the listings
+    Covers its own page, the listings it is on, and the sitemap. A plain
+    edit only needs post_key() - every listing showing the post carries it.
+    """
+    keys = {post_key(post.pk), POST_LIST_KEY, SITEMAP_KEY}
+    if post.author_id:
+        keys.add(author_list_key(post.author_id))
+    return keys
+
+
+# =============================================================================
+# EMITTING KEYS
+# =============================================================================
+
+def add_surrogate_keys(request, *keys):
+    """
+    Record keys that the response to this request depends on
+    """
+    request.surrogate_keys.update(keys)
+
+
+class SurrogateKeysMixin:
+    """
+    Mixin for class-based views - adds the keys from get_surrogate_keys()
+    get_surrogate_keys(context) returns the keys for the objects on the page.
+    """
+    def get_surrogate_keys(self, context):
+        return set()
+
+    def render_to_response(self, context, **response_kwargs):
+        # Called with the finished context, after every get_context_data()
+        add_surrogate_keys(self.request, *self.get_surrogate_keys(context))
+        return super().render_to_response(context, **response_kwargs)
+
+
+def keys_for_posts(posts):
+    """
+    Keys for a page of posts - each post, author and tag shown
+    Expects post.tags to be prefetched, as every view showing tag badges does.
+    """
+    keys = set()
+    for post in posts:
+        keys.add(post_key(post.pk))
+        if post.author_id:
+            keys.add(author_key(post.author_id))
+        keys.update(tag_key(tag.pk) for tag in post.tags.all())
+    return keys
+
+
+# =============================================================================
+# PURGERS
+# =============================================================================
+
+class BasePurger:
+    """
+    Interface for purge backends - purge() receives a set of keys
+    """
+    def purge(self, keys):
+        raise NotImplementedError
+
+
+class InMemoryPurger(BasePurger):
+    """
+    Records purges instead of sending them - for tests and development
+    Keeps the most recent history_size purges in self.history.
+    """
+    def __init__(self, history_size=1000):
+        self.history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def purge(self, keys):
+        with self._lock:
+            self.history.append(frozenset(keys))
+
+    def purged_keys(self):
+        """
+        Every key purged so far, as one set
+        """
+        with self._lock:
+            return set().union(*self.history)
+
+    def clear(self):
+        with self._lock:
+            self.history.clear()
+
+
+class HTTPPurger(BasePurger):
+    """
+    Sends purges to the proxy's HTTP purge API
+    One POST per batch, keys in a Surrogate-Key header, sent from a
+    background thread so a slow or unreachable proxy never delays a request.
+    Failures are logged and dropped - the TTL is the fallback.
+    """
+    def __init__(self, url, timeout=5, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+        self._outbox = queue.SimpleQueue()
+        self._worker = threading.Thread(target=self._run, name='cache-purger', daemon=True)
+        self._worker.start()
+
+    def purge(self, keys):
+        self._outbox.put(frozenset(keys))
+
+    def _run(self):
+        while True:
+            keys = self._outbox.get()
+            # Merge whatever else is already waiting into the same request
+            while True:
+                try:
+                    keys |= self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+            self.send(keys)
+
+    def send(self, keys):
+        # Imported here - urllib.request pulls in ssl and email, which every
+        # worker would otherwise load at startup whichever purger is in use
+        import urllib.request
+        request = urllib.request.Request(
+            self.url, method='POST', data=b'',
+            headers={**self.headers, 'Surrogate-Key': ' '.join(sorted(keys))},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except OSError as exc:
+            logger.warning('Cache purge of %d key(s) failed: %s', len(keys), exc)
+
+
+@lru_cache(maxsize=None)
+def get_purger():
+    """
+    Return the process-wide purger configured by settings.CACHE_PURGER
+    CACHE_PURGER_OPTIONS are passed to its constructor.
+    """
+    purger_class = import_string(getattr(settings, 'CACHE_PURGER', 'miniblog.surrogate_keys.InMemoryPurger'))
+    return purger_class(**getattr(settings, 'CACHE_PURGER_OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_purger(setting, **kwargs):
+    """
+    Rebuild the purger when override_settings swaps it, e.g. in tests
+    """
+    if setting.startswith('CACHE_PURGER'):
+        get_purger.cache_clear()
+
+
+# Keys waiting to be purged at the end of the current request
+_pending = contextvars.ContextVar('surrogate_key_purges', default=None)
+
+
+def purge_keys(keys):
+    """
+    Purge keys once the current transaction commits
+    Inside a request the purges are batched and sent once the response is
+    ready; anywhere else (shell, management commands) they go straight out.
+    """
+    keys = set(keys)
+    if keys:
+        transaction.on_commit(lambda: _queue_purge(keys))
+
+
+def _queue_purge(keys):
+    pending = _pending.get()
+    if pending is not None:
+        pending.update(keys)
+    else:
+        get_purger().purge(keys)
+
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+class SurrogateKeyMiddleware:
+    """
+    Adds Surrogate-Key and Cache-Tag headers and sends batched purges
+    Views add keys with add_surrogate_keys(); every response also gets
+    the site-wide key. Purges triggered while handling the request are
+    sent as a single batch after the response is built.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.surrogate_keys = {SITE_KEY}
+        token = _pending.set(set())
+        try:
+            response = self.get_response(request)
+        finally:
+            purges = _pending.get()
+            _pending.reset(token)
+            if purges:
+                get_purger().purge(purges)
+
+        keys = sorted(request.surrogate_keys)
+        response['Surrogate-Key'] = ' '.join(keys)
+        response['Cache-Tag'] = ','.join(keys)
+        return response
+
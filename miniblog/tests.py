@@ -1,3 +1,685 @@
-from django.test import TestCase
+# Import Django test tools
+import asyncio
+import re
+import threading
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import sitemaps, warmup
+from .auth_guard import (
+    AuthGuard, AuthOverloaded, AuthThrottled, Throttle, client_ip, get_auth_guard, reset_auth_guard,
+)
+from .events import (
+    CommentStreamRouter, InProcessBroker, LocalBroker, channel_for_post, comment_event_stream, get_broker,
+)
+from .forms import PostForm
+from .loadtest import parse_mix, percentile, summarise
+from .models import Comment, Post, PostTag, Tag
+from .surrogate_keys import get_purger
+
+# Tests - run with: python manage.py test miniblog
+
+# Hashing with PBKDF2 takes most of a second; tests only need a real hasher
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class FakeClock:
+    """
+    Stand-in for time.monotonic that only moves when told to
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class GuardResetMixin:
+    """
+    Start every test with a fresh auth guard
+    The guard and its throttle buckets are process-wide, so without this
+    one test's login attempts would count against the next.
+    """
+    def setUp(self):
+        super().setUp()
+        reset_auth_guard()
+        self.addCleanup(reset_auth_guard)
+
+
+# =============================================================================
+# AUTH GUARD
+# =============================================================================
+
+class ThrottleTests(TestCase):
+    def test_bucket_empties_then_refills(self):
+        clock = FakeClock()
+        throttle = Throttle(2, 10, clock=clock)  # 2 attempts, one more every 5 seconds
+        self.assertEqual(throttle.take('ip:a'), 0)
+        self.assertEqual(throttle.take('ip:a'), 0)
+        self.assertAlmostEqual(throttle.take('ip:a'), 5.0)
+        clock.now += 5
+        self.assertEqual(throttle.take('ip:a'), 0)
+
+    def test_keys_have_separate_buckets(self):
+        throttle = Throttle(1, 60, clock=FakeClock())
+        self.assertEqual(throttle.take('ip:a'), 0)
+        self.assertEqual(throttle.take('ip:b'), 0)
+        self.assertGreater(throttle.take('ip:a'), 0)
+
+    def test_least_recently_used_key_is_evicted(self):
+        throttle = Throttle(1, 60, max_keys=2, clock=FakeClock())
+        throttle.take('ip:a')
+        throttle.take('ip:b')
+        throttle.take('ip:c')  # Evicts ip:a, which starts over with a full bucket
+        self.assertEqual(throttle.take('ip:a'), 0)
+
+    def test_retry_after_rounds_up_to_whole_seconds(self):
+        self.assertEqual(AuthThrottled(0.2).retry_after, 1)
+        self.assertEqual(AuthThrottled(4.1).retry_after, 5)
+
+
+class AuthGuardTests(TestCase):
+    def test_check_raises_when_account_is_out_of_attempts(self):
+        guard = AuthGuard(workers=0, account_limit=(1, 60))
+        guard.check('10.0.0.1', 'Alice')
+        with self.assertRaises(AuthThrottled):
+            guard.check('10.0.0.2', 'alice')  # Account names are case-insensitive
+
+    def test_sheds_work_when_pool_and_queue_are_full(self):
+        guard = AuthGuard(workers=1, queue_size=0)
+        self.addCleanup(guard.shutdown)
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash():
+            started.set()
+            release.wait(5)
+            return 'hashed'
+
+        worker = threading.Thread(target=lambda: guard.execute(slow_hash))
+        worker.start()
+        started.wait(5)
+        with self.assertRaises(AuthOverloaded):
+            guard.execute(lambda: 'never runs')
+        release.set()
+        worker.join()
+        # The slot is free again once the first hash finishes
+        self.assertEqual(guard.execute(lambda: 'ok'), 'ok')
+
+
+class ClientIPTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_untrusted_remote_addr_ignores_forwarded_header(self):
+        request = self.factory.get('/', REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='1.2.3.4')
+        self.assertEqual(client_ip(request, []), '203.0.113.5')
+
+    def test_trusted_proxies_are_skipped_from_the_right(self):
+        guard = AuthGuard(workers=0, trusted_proxies=['127.0.0.1', '10.0.0.0/8'])
+        request = self.factory.get('/', REMOTE_ADDR='127.0.0.1',
+                                   HTTP_X_FORWARDED_FOR='6.6.6.6, 198.51.100.7, 10.1.2.3')
+        # 6.6.6.6 was added by the client itself and is not trusted
+        self.assertEqual(client_ip(request, guard.trusted_proxies), '198.51.100.7')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, AUTH_HASH_WORKERS=2)
+class AuthViewTests(GuardResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('alice', password='correct-horse-42')
+
+    def test_login_through_guarded_pool(self):
+        self.assertIsNotNone(get_auth_guard()._executor)
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'correct-horse-42'})
+        self.assertRedirects(response, reverse('post-list'))
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+    def test_wrong_password_is_rejected(self):
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    @override_settings(AUTH_THROTTLE_ACCOUNT=(1, 60))
+    def test_throttled_login_gets_429_with_retry_after(self):
+        self.client.post(reverse('login'), {'username': 'alice', 'password': 'wrong'})
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'correct-horse-42'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    @override_settings(AUTH_THROTTLE_IP=(1, 60), AUTH_TRUSTED_PROXIES=['127.0.0.1'])
+    def test_clients_behind_a_trusted_proxy_get_their_own_bucket(self):
+        for address in ('198.51.100.1', '198.51.100.2'):
+            response = self.client.post(
+                reverse('login'), {'username': 'alice', 'password': 'correct-horse-42'},
+                HTTP_X_FORWARDED_FOR=address,
+            )
+            self.assertEqual(response.status_code, 302)
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        old_hasher = 'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher'
+        with override_settings(PASSWORD_HASHERS=[old_hasher]):
+            self.user.set_password('correct-horse-42')
+            self.user.save()
+        # The old algorithm is still accepted but no longer preferred
+        with override_settings(PASSWORD_HASHERS=FAST_HASHERS + [old_hasher]):
+            self.client.post(reverse('login'), {'username': 'alice', 'password': 'correct-horse-42'})
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('md5$'))
+
+    def test_register_through_guarded_pool(self):
+        response = self.client.post(reverse('register'), {
+            'username': 'bob', 'email': 'bob@example.com',
+            'password1': 'another-Secret-99', 'password2': 'another-Secret-99',
+        })
+        self.assertRedirects(response, reverse('post-list'))
+        self.assertTrue(User.objects.get(username='bob').check_password('another-Secret-99'))
+
+
+# =============================================================================
+# TAGS
+# =============================================================================
+
+class TagCountTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('writer')
+        self.post = Post.objects.create(title='First', content='Body', author=self.author)
+
+    def counts(self):
+        return dict(Tag.objects.values_list('slug', 'post_count'))
+
+    def test_set_tags_creates_tags_and_counts(self):
+        self.post.set_tags(['Django', 'Python', 'django'])
+        self.assertEqual(self.counts(), {'django': 1, 'python': 1})
+        self.assertEqual(Tag.objects.get(slug='django').name, 'Django')
+
+    def test_set_tags_only_writes_the_difference(self):
+        self.post.set_tags(['Django', 'Python'])
+        kept = PostTag.objects.get(post=self.post, tag__slug='python').pk
+        self.post.set_tags(['python', 'Web'])
+        self.assertEqual(self.counts(), {'django': 0, 'python': 1, 'web': 1})
+        # The unchanged link was left alone, not deleted and re-inserted
+        self.assertEqual(PostTag.objects.get(post=self.post, tag__slug='python').pk, kept)
+
+    def test_counts_follow_several_posts(self):
+        other = Post.objects.create(title='Second', content='Body', author=self.author)
+        self.post.set_tags(['Django'])
+        other.set_tags(['Django', 'Python'])
+        self.assertEqual(self.counts(), {'django': 2, 'python': 1})
+
+    def test_deleting_a_post_releases_its_tags(self):
+        self.post.set_tags(['Django', 'Python'])
+        self.post.delete()
+        self.assertEqual(self.counts(), {'django': 0, 'python': 0})
+
+    def test_deleting_the_author_releases_tags_of_cascaded_posts(self):
+        Post.objects.create(title='Second', content='Body', author=self.author).set_tags(['Django'])
+        self.post.set_tags(['Django'])
+        self.author.delete()
+        self.assertEqual(self.counts(), {'django': 0})
+
+    def test_saving_a_post_keeps_the_tag_date_in_step(self):
+        self.post.set_tags(['Django'])
+        self.post.date_posted = timezone.now() - timedelta(days=3)
+        self.post.save()
+        self.assertEqual(PostTag.objects.get(post=self.post).date_posted, self.post.date_posted)
+
+
+class PostFormTagTests(TestCase):
+    def form(self, tags):
+        return PostForm(data={'title': 'Title', 'content': 'Body', 'tags': tags})
+
+    def test_names_without_a_slug_are_rejected(self):
+        form = self.form('django, ++')
+        self.assertFalse(form.is_valid())
+        self.assertIn('"++" needs at least one letter', form.errors['tags'][0])
+
+    def test_names_sharing_a_slug_are_rejected(self):
+        form = self.form('C++, C#')
+        self.assertFalse(form.is_valid())
+        self.assertIn('"C++" and "C#" would be the same tag.', form.errors['tags'])
+
+    def test_names_swallowed_by_an_existing_tag_are_rejected(self):
+        Tag.objects.create(name='C', slug='c')
+        form = self.form('C++')
+        self.assertFalse(form.is_valid())
+        self.assertIn('existing tag "C"', form.errors['tags'][0])
+
+    def test_names_longer_than_the_field_are_rejected(self):
+        form = self.form('a' * 60 + 'Z')
+        self.assertFalse(form.is_valid())
+        self.assertIn('is longer than 50 characters', form.errors['tags'][0])
+        self.assertTrue(self.form('a' * 50).is_valid())
+
+    def test_different_case_of_the_same_name_is_accepted(self):
+        Tag.objects.create(name='Django', slug='django')
+        self.assertTrue(self.form('django, DJANGO').is_valid())
+
+    def test_save_applies_tags(self):
+        form = self.form('Django, Python')
+        self.assertTrue(form.is_valid())
+        form.instance.author = User.objects.create_user('writer')
+        post = form.save()
+        self.assertEqual(sorted(post.tags.values_list('slug', flat=True)), ['django', 'python'])
+
+
+class TagPageTests(TestCase):
+    def test_lists_tagged_posts_newest_first(self):
+        author = User.objects.create_user('writer')
+        now = timezone.now()
+        old = Post.objects.create(title='Old', content='Body', author=author, date_posted=now - timedelta(days=2))
+        new = Post.objects.create(title='New', content='Body', author=author, date_posted=now)
+        Post.objects.create(title='Untagged', content='Body', author=author)
+        old.set_tags(['Django'])
+        new.set_tags(['Django'])
+        response = self.client.get(reverse('tag-posts', kwargs={'slug': 'django'}))
+        self.assertEqual(list(response.context['posts']), [new, old])
+
+    def test_page_count_comes_from_the_stored_post_count(self):
+        author = User.objects.create_user('writer')
+        for n in range(7):
+            Post.objects.create(title=f'Post {n}', content='Body', author=author).set_tags(['Django'])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('tag-posts', kwargs={'slug': 'django'}), {'page': 2})
+        self.assertEqual(response.context['paginator'].num_pages, 2)
+        self.assertEqual(len(response.context['posts']), 2)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+
+
+# =============================================================================
+# SURROGATE KEYS
+# =============================================================================
+
+@override_settings(CACHE_PURGER='miniblog.surrogate_keys.InMemoryPurger', PASSWORD_HASHERS=FAST_HASHERS)
+class SurrogateKeyTests(GuardResetMixin, TransactionTestCase):
+    """
+    TransactionTestCase so on_commit purges fire as they would in production,
+    inside the request that caused them
+    """
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user('writer', password='correct-horse-42')
+        self.post = Post.objects.create(title='First', content='Body', author=self.author)
+        self.post.set_tags(['Django'])
+        self.tag = Tag.objects.get(slug='django')
+        self.purger = get_purger()
+        self.purger.clear()
+
+    def keys(self, response):
+        return set(response['Surrogate-Key'].split())
+
+    def test_listing_carries_post_author_tag_and_list_keys(self):
+        response = self.client.get(reverse('post-list'))
+        self.assertEqual(self.keys(response), {
+            'site', 'posts', f'post-{self.post.pk}', f'author-{self.author.pk}', f'tag-{self.tag.pk}',
+        })
+        self.assertEqual(response['Cache-Tag'], ','.join(sorted(self.keys(response))))
+
+    def test_only_the_detail_page_carries_the_comments_key(self):
+        detail = self.keys(self.client.get(self.post.get_absolute_url()))
+        self.assertIn(f'comments-post-{self.post.pk}', detail)
+        for url in (reverse('post-list'), reverse('user-posts', args=['writer']),
+                    reverse('tag-posts', args=['django'])):
+            self.assertNotIn(f'comments-post-{self.post.pk}', self.keys(self.client.get(url)))
+
+    def test_creating_a_post_purges_its_listings_in_one_batch(self):
+        self.client.force_login(self.author)
+        self.purger.clear()
+        self.client.post(reverse('post-create'), {'title': 'New', 'content': 'Body', 'tags': 'Django, Web'})
+        new = Post.objects.get(title='New')
+        web = Tag.objects.get(slug='web')
+        self.assertEqual(list(self.purger.history), [frozenset({
+            f'post-{new.pk}', 'posts', f'posts-author-{self.author.pk}', 'sitemap',
+            f'posts-tag-{self.tag.pk}', f'posts-tag-{web.pk}',
+        })])
+
+    def test_editing_a_post_purges_only_its_own_key(self):
+        self.client.force_login(self.author)
+        self.purger.clear()
+        self.client.post(reverse('post-update', args=[self.post.pk]),
+                         {'title': 'Edited', 'content': 'Body', 'tags': 'Django'})
+        self.assertEqual(self.purger.purged_keys(), {f'post-{self.post.pk}'})
+
+    def test_re_dating_a_post_purges_its_listings(self):
+        self.post.date_posted = timezone.now() - timedelta(days=1)
+        self.post.save()
+        self.assertIn('posts', self.purger.purged_keys())
+        self.assertIn(f'posts-tag-{self.tag.pk}', self.purger.purged_keys())
+
+    def test_commenting_purges_only_the_comments_key(self):
+        self.client.force_login(self.author)
+        self.purger.clear()
+        self.client.post(reverse('add-comment', args=[self.post.pk]), {'content': 'Nice'})
+        self.assertEqual(list(self.purger.history), [frozenset({f'comments-post-{self.post.pk}'})])
+
+    def test_renaming_a_tag_purges_pages_showing_it(self):
+        self.tag.name = 'Django Web'
+        self.tag.save()
+        self.assertEqual(self.purger.purged_keys(), {f'tag-{self.tag.pk}', f'posts-tag-{self.tag.pk}'})
+
+    def test_logging_in_does_not_purge_the_author(self):
+        self.client.post(reverse('login'), {'username': 'writer', 'password': 'correct-horse-42'})
+        self.assertEqual(self.purger.purged_keys(), set())
+        self.author.email = 'writer@example.com'
+        self.author.save()
+        self.assertEqual(self.purger.purged_keys(), {f'author-{self.author.pk}'})
+
+    def test_renaming_an_author_purges_the_sitemap_and_their_posts_page(self):
+        self.assertIn('sitemap', self.keys(self.client.get(reverse('sitemap-authors', args=[0]))))
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(self.purger.purged_keys(), {
+            f'author-{self.author.pk}', f'posts-author-{self.author.pk}', 'sitemap',
+        })
+
+    def test_rolled_back_changes_are_not_purged(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Comment.objects.create(post=self.post, author=self.author, content='Gone')
+            raise RuntimeError
+        self.assertEqual(list(self.purger.history), [])
+
+
+# =============================================================================
+# SITEMAPS
+# =============================================================================
+
+@override_settings(SITEMAP_SHARD_SIZE=3, SITEMAP_BATCH_SIZE=2)
+class SitemapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.author = User.objects.create_user('writer')
+        self.posts = [Post.objects.create(title=f'Post {n}', content='Body', author=self.author)
+                      for n in range(5)]
+
+    def shard(self, name, shard):
+        response = self.client.get(reverse(f'sitemap-{name}', kwargs={'shard': shard}))
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            return b''.join(response.streaming_content).decode()
+        return response.content.decode()
+
+    def test_index_lists_every_non_empty_shard(self):
+        response = self.client.get(reverse('sitemap'))
+        content = response.content.decode()
+        for name, shard in (('posts', 0), ('posts', 1), ('authors', 0)):
+            self.assertIn(f'http://testserver/sitemap-{name}-{shard}.xml', content)
+        self.assertNotIn('sitemap-posts-2.xml', content)
+
+    def test_shard_lists_the_posts_in_its_id_range(self):
+        content = self.shard('posts', 0)
+        for post in self.posts:
+            expected = f'<loc>http://testserver{post.get_absolute_url()}</loc>'
+            if post.pk <= 3:
+                self.assertIn(expected, content)
+            else:
+                self.assertNotIn(expected, content)
+
+    def test_empty_shard_is_404(self):
+        response = self.client.get(reverse('sitemap-posts', kwargs={'shard': 5}))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SITEMAP_SHARD_SIZE=100)
+    def test_shard_is_read_in_keyset_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            content = self.shard('posts', 0)
+        # Two full batches, one partial one, then an empty read that ends the scan
+        batches = [query for query in queries if 'LIMIT 2' in query['sql']]
+        self.assertEqual(len(batches), 4)
+        locations = [f'http://testserver{post.get_absolute_url()}' for post in self.posts]
+        self.assertEqual(re.findall(r'<loc>(.*?)</loc>', content), locations)
+
+    def test_re_dating_an_older_post_rebuilds_the_shard(self):
+        self.shard('posts', 0)  # Cached
+        moved = self.posts[0]
+        moved.date_posted = timezone.now() - timedelta(days=100)
+        moved.save()
+        self.assertIn(sitemaps.format_lastmod(moved.date_posted), self.shard('posts', 0))
+
+    def test_renaming_an_author_rebuilds_the_author_shard(self):
+        self.assertIn('/user/writer', self.shard('authors', 0))  # Cached
+        self.author.username = 'renamed'
+        self.author.save()
+        content = self.shard('authors', 0)
+        self.assertIn('/user/renamed', content)
+        self.assertNotIn('/user/writer', content)
+
+
+# =============================================================================
+# COMMENT STREAM
+# =============================================================================
+
+class BrokerTests(TestCase):
+    async def test_in_process_broker_fans_out_per_channel(self):
+        broker = InProcessBroker()
+        first, second = broker.subscribe('post:1'), broker.subscribe('post:1')
+        other = broker.subscribe('post:2')
+        broker.publish('post:1', {'id': 1})
+        self.assertEqual(await first.get(timeout=1), {'id': 1})
+        self.assertEqual(await second.get(timeout=1), {'id': 1})
+        self.assertIsNone(await other.get(timeout=0.01))
+
+    async def test_closing_the_last_subscription_drops_the_channel(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe('post:1')
+        self.assertEqual(broker.subscriber_count('post:1'), 1)
+        subscription.close()
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_slow_subscriber_is_marked_overflowed(self):
+        broker = InProcessBroker(queue_size=1)
+        subscription = broker.subscribe('post:1')
+        broker.publish('post:1', {'id': 1})
+        broker.publish('post:1', {'id': 2})
+        self.assertEqual(await subscription.get(timeout=1), {'id': 1})
+        self.assertTrue(subscription.overflowed)
+
+    async def test_local_broker_delivers_from_its_own_thread(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe('post:1')
+        await asyncio.to_thread(broker.publish, 'post:1', {'id': 1, 'content': 'Hi'})
+        self.assertEqual(await subscription.get(timeout=5), {'id': 1, 'content': 'Hi'})
+
+    async def test_event_stream_skips_messages_already_in_the_backlog(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe('post:1')
+        broker.publish('post:1', {'id': 2})
+        broker.publish('post:1', {'id': 3})
+        stream = comment_event_stream(subscription, backlog=[{'id': 1}, {'id': 2}])
+        frames = [await anext(stream) for _ in range(4)]
+        await stream.aclose()
+        self.assertEqual(frames[0], 'retry: 3000\n\n')
+        self.assertEqual([frame.split('\n')[0] for frame in frames[1:]], ['id: 1', 'id: 2', 'id: 3'])
+
+
+class CommentStreamTests(TransactionTestCase):
+    """
+    Drives CommentStreamRouter in-process with a fake receive/send pair
+    TransactionTestCase because the stream closes its database connection
+    before it starts waiting, which a TestCase transaction would not survive.
+    """
+    def setUp(self):
+        self.author = User.objects.create_user('writer')
+        self.post = Post.objects.create(title='First', content='Body', author=self.author)
+        self.first = Comment.objects.create(post=self.post, author=self.author, content='First')
+        self.passed_through = []
+        self.router = CommentStreamRouter(self.django_app)
+
+    async def django_app(self, scope, receive, send):
+        self.passed_through.append(scope['path'])
+
+    def scope(self, post_id=None, method='GET', headers=(), query=b'', root_path=''):
+        path = root_path + reverse('comment-stream', kwargs={'pk': post_id or self.post.pk})
+        return {
+            'type': 'http', 'method': method, 'path': path, 'root_path': root_path,
+            'query_string': query, 'headers': [(b'host', b'testserver'), *headers],
+        }
+
+    async def stream(self, scope, publish=(), until=()):
+        """
+        Open one stream, publish messages once it is listening, and hang up
+        once every id in until has arrived (or straight after publishing)
+        Returns (status, ids of the comment events received).
+        """
+        opened, hang_up = asyncio.Event(), asyncio.Event()
+        status, ids = [], []
+
+        async def receive():
+            if not status:
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await hang_up.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+                opened.set()
+                return
+            ids.extend(int(line[4:]) for line in message['body'].decode().splitlines() if line.startswith('id: '))
+            if set(until) <= set(ids):
+                hang_up.set()
+
+        connection = asyncio.ensure_future(self.router(scope, receive, send))
+        await asyncio.wait_for(opened.wait(), 5)
+        for message in publish:
+            get_broker().publish(channel_for_post(self.post.pk), message)
+        if not until:
+            hang_up.set()
+        await asyncio.wait_for(connection, 5)
+        return status[0], ids
+
+    def test_match_resolves_only_the_stream_route(self):
+        self.assertEqual(CommentStreamRouter.match(f'/post/{self.post.pk}/comments/stream/'), self.post.pk)
+        self.assertIsNone(CommentStreamRouter.match(f'/post/{self.post.pk}/'))
+        self.assertIsNone(CommentStreamRouter.match('/no/such/page/'))
+
+    async def test_other_paths_go_to_django(self):
+        await self.router({'type': 'http', 'path': '/about/', 'root_path': ''}, None, None)
+        self.assertEqual(self.passed_through, ['/about/'])
+
+    async def test_stream_is_served_under_a_root_path(self):
+        status, ids = await self.stream(self.scope(root_path='/blog', query=b'last_id=0'), until=[self.first.pk])
+        self.assertEqual((status, ids), (200, [self.first.pk]))
+        self.assertEqual(self.passed_through, [])
+
+    async def test_unknown_post_is_404(self):
+        status, _ = await self.stream(self.scope(post_id=self.post.pk + 100))
+        self.assertEqual(status, 404)
+
+    async def test_post_is_405(self):
+        status, _ = await self.stream(self.scope(method='POST'))
+        self.assertEqual(status, 405)
+
+    async def test_first_connection_catches_up_from_the_rendered_comment(self):
+        # The page rendered self.first, then another comment landed before the
+        # browser opened the stream - it must not be lost
+        missed = await Comment.objects.acreate(post=self.post, author=self.author, content='Missed')
+        status, ids = await self.stream(self.scope(query=f'last_id={self.first.pk}'.encode()), until=[missed.pk])
+        self.assertEqual(ids, [missed.pk])
+
+    async def test_last_event_id_header_wins_over_query(self):
+        newer = await Comment.objects.acreate(post=self.post, author=self.author, content='Seen')
+        live = {'id': newer.pk + 1000, 'post': self.post.pk, 'author': 'writer', 'content': 'Live', 'date': ''}
+        scope = self.scope(headers=[(b'last-event-id', str(newer.pk).encode())], query=b'last_id=0')
+        status, ids = await self.stream(scope, publish=[live], until=[live['id']])
+        self.assertEqual(ids, [live['id']])
+
+    async def test_live_comments_already_in_the_backlog_are_not_repeated(self):
+        first = {'id': self.first.pk, 'post': self.post.pk, 'author': 'writer', 'content': 'First', 'date': ''}
+        live = dict(first, id=self.first.pk + 1000)
+        status, ids = await self.stream(self.scope(query=b'last_id=0'), publish=[first, live], until=[live['id']])
+        self.assertEqual(ids, [self.first.pk, live['id']])
+
+    def test_post_page_passes_its_newest_comment_to_the_stream(self):
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertContains(response, f'comments/stream/?last_id={self.first.pk}')
+
+
+# =============================================================================
+# LOAD TEST
+# =============================================================================
+
+class LoadTestResultTests(SimpleTestCase):
+    def test_percentile_is_nearest_rank(self):
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 0.5), 3)
+        self.assertEqual(percentile(list(range(1, 151)), 0.99), 149)
+        self.assertEqual(percentile(list(range(1, 11)), 0.9), 9)
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('browse=70, comment=30'), {'browse': 70.0, 'comment': 30.0})
+
+    def test_parse_mix_rejects_unknown_scenarios_and_zero_weights(self):
+        with self.assertRaises(ValueError):
+            parse_mix('browse=70,shop=30')
+        with self.assertRaises(ValueError):
+            parse_mix('browse=0')
+
+    def test_summarise_groups_by_request_name(self):
+        samples = [
+            ('browse:list', 0.010, 200, None),
+            ('browse:list', 0.030, 200, None),
+            ('browse:list', 0.020, 200, None),
+            ('login', 0.100, 503, 'HTTP 503'),
+        ]
+        summary = summarise(samples, duration=2)
+        self.assertEqual(summary['total']['requests'], 4)
+        self.assertEqual(summary['total']['errors'], 1)
+        self.assertEqual(summary['total']['rps'], 2)
+        browse = summary['requests']['browse:list']
+        self.assertEqual(browse['error_rate'], 0)
+        self.assertAlmostEqual(browse['latency_ms']['p50'], 20)
+        self.assertAlmostEqual(browse['latency_ms']['max'], 30)
+        self.assertEqual(summary['error_kinds'], {'HTTP 503': 1})
+
+
+# =============================================================================
+# WARM-UP
+# =============================================================================
+
+IMPORT_TIME_OUTPUT = '''\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      1500 |       2500 |     django.utils.functional
+import time:       800 |       4000 |   django.utils
+import time:      2000 |       9000 | django
+Traceback lines and other output are ignored
+import time:       300 |        300 | miniblog.warmup
+'''
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_parse_import_times(self):
+        imports = warmup.parse_import_times(IMPORT_TIME_OUTPUT)
+        self.assertEqual([entry['module'] for entry in imports],
+                         ['_io', 'django.utils.functional', 'django.utils', 'django', 'miniblog.warmup'])
+        self.assertEqual(imports[1], {
+            'module': 'django.utils.functional', 'self_ms': 1.5, 'cumulative_ms': 2.5, 'depth': 2,
+        })
+        self.assertEqual(imports[3]['depth'], 0)
+
+    def test_summarise_imports_groups_self_time_by_package(self):
+        imports = warmup.parse_import_times(IMPORT_TIME_OUTPUT)
+        self.assertEqual(warmup.summarise_imports(imports), [
+            ('django', 4.3), ('miniblog', 0.3), ('_io', 0.12),
+        ])
+        self.assertEqual(warmup.summarise_imports(imports, package_depth=2)[0], ('django.utils', 2.3))
+
+    def test_warm_requests_warns_about_failing_urls(self):
+        def application(environ, start_response):
+            start_response('500 Internal Server Error' if environ['PATH_INFO'] == '/' else '200 OK', [])
+            return [b'']
+
+        with self.assertLogs('miniblog.warmup', 'WARNING') as logs:
+            detail = warmup.warm_requests(application, ['/', '/about/'])
+        self.assertEqual(detail, '/ 500, /about/ 200')
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('/ returned 500', logs.output[0])
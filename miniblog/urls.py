@@ -9,7 +9,8 @@ from .views import (
     PostCreateView,   # Create new post page
     PostUpdateView,   # Edit existing post page
     PostDeleteView,   # Delete post confirmation page
-    UserPostListView  # Posts by specific user page
+    UserPostListView, # Posts by specific user page
+    TagPostListView   # Posts with a specific tag page
 )
 
 # URL patterns for the miniblog app
@@ -23,6 +24,10 @@ urlpatterns = [
     # <str:username> captures the username from the URL
     path('user/<str:username>', UserPostListView.as_view(), name='user-posts'),
     
+    # Tag posts - shows posts carrying a tag
+    # <slug:slug> captures the tag's slug from the URL
+    path('tag/<slug:slug>/', TagPostListView.as_view(), name='tag-posts'),
+    
     # Post detail - shows a single post with comments
     # <int:pk> captures the post ID as an integer
     path('post/<int:pk>/', PostDetailView.as_view(), name='post-detail'),
@@ -39,6 +44,16 @@ urlpatterns = [
     # Add comment to a post
     path('post/<int:pk>/comment/', views.add_comment, name='add-comment'),
     
+    # Live stream of new comments (Server-Sent Events, served under ASGI)
+    path('post/<int:pk>/comments/stream/', views.comment_stream, name='comment-stream'),
+    
+    # Sitemaps and robots.txt for search engine crawlers
+    # Child sitemaps are shards of posts/authors by id range
+    path('sitemap.xml', views.sitemap_index, name='sitemap'),
+    path('sitemap-posts-<int:shard>.xml', views.sitemap_section, {'section': 'posts'}, name='sitemap-posts'),
+    path('sitemap-authors-<int:shard>.xml', views.sitemap_section, {'section': 'authors'}, name='sitemap-authors'),
+    path('robots.txt', views.robots_txt, name='robots'),
+    
     # User authentication URLs
     path('register/', views.register, name='register'),
     path('login/', views.user_login, name='login'),
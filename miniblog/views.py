@@ -5,9 +5,16 @@ from django.contrib.auth.decorators import login_required         # Decorator to
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView  # Class-based views
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin  # Mixins for class-based views
 from django.contrib import messages                               # Flash messages system
-from django.urls import reverse_lazy                              # URL reversal for class-based views
+from django.urls import reverse, reverse_lazy                     # URL reversal for views
 from django.contrib.auth.models import User                       # Django's User model
-from .models import Post, Comment                                 # Our custom models
+from django.core.paginator import Paginator                       # Splits listings into pages
+from django.db import transaction                                 # Run code after the DB commit
+from django.http import Http404, HttpResponse, StreamingHttpResponse  # Plain and streamed responses
+from .models import Post, Comment, Tag                            # Our custom models
+from .events import publish_comment                               # Live comment pub/sub
+from . import sitemaps                                            # Sitemap and robots.txt generation
+from .auth_guard import AuthRejected, get_auth_guard              # Throttling and hashing pool for auth
+from . import surrogate_keys as keys                              # Cache keys for the fronting proxy
 from .forms import UserRegisterForm, UserLoginForm, PostForm, CommentForm  # Our custom forms
 
 # Views - These handle HTTP requests and return HTTP responses
@@ -17,6 +24,20 @@ from .forms import UserRegisterForm, UserLoginForm, PostForm, CommentForm  # Our
 # USER AUTHENTICATION VIEWS
 # =============================================================================
 
+# Password hashing is slow on purpose. Both views below hand it to the auth
+# guard (miniblog/auth_guard.py), which throttles attempts and runs the hash
+# in a small bounded pool so a burst of sign-ins cannot tie up every worker.
+
+def _auth_rejected(request, template, form, rejection):
+    """
+    Re-render an auth form after the guard refused the attempt
+    Uses 429 (throttled) or 503 (overloaded) with a Retry-After hint.
+    """
+    messages.error(request, rejection.message)
+    response = render(request, template, {'form': form}, status=rejection.status)
+    response['Retry-After'] = str(rejection.retry_after)
+    return response
+
 def register(request):
     """
     Handle user registration
@@ -28,8 +49,15 @@ def register(request):
         form = UserRegisterForm(request.POST)
         
         if form.is_valid():
-            # Form data is valid, create the user
-            user = form.save()  # This creates and saves the user to database
+            # Form data is valid - hash the password through the auth guard.
+            # save(commit=False) only builds the user in memory, no database access
+            try:
+                user = get_auth_guard().run(request, None, form.save, commit=False)
+            except AuthRejected as rejection:
+                return _auth_rejected(request, 'miniblog/register.html', form, rejection)
+            
+            # Save the new user to the database
+            user.save()
             
             # Automatically log in the new user
             login(request, user)
@@ -54,9 +82,19 @@ def user_login(request):
     """
     if request.method == 'POST':
         # User submitted login credentials
-        form = UserLoginForm(data=request.POST)
+        # Passing the request lets the auth backend throttle by client address
+        form = UserLoginForm(request, data=request.POST)
         
-        if form.is_valid():
+        # Validating the form checks the password hash through the auth guard
+        # (GuardedModelBackend), which notes on the request if it refused
+        valid = form.is_valid()
+        rejection = getattr(request, 'auth_rejected', None)
+        if rejection is not None:
+            # Show a fresh form without the "invalid login" error
+            form = UserLoginForm(initial={'username': request.POST.get('username', '')})
+            return _auth_rejected(request, 'miniblog/login.html', form, rejection)
+        
+        if valid:
             # Credentials are valid, get the authenticated user
             user = form.get_user()
             
@@ -94,7 +132,11 @@ def user_logout(request):
 # BLOG POST VIEWS
 # =============================================================================
 
-class PostListView(ListView):
+# Every view below labels its response with surrogate keys (see
+# miniblog/surrogate_keys.py) so a caching proxy in front of the site can
+# purge exactly the pages that show a post once it changes.
+
+class PostListView(keys.SurrogateKeysMixin, ListView):
     """
     Display a list of all blog posts
     ListView is a Django class-based view that handles displaying lists of objects
@@ -104,8 +146,27 @@ class PostListView(ListView):
     context_object_name = 'posts'  # Name for the list in the template (default would be 'object_list')
     ordering = ['-date_posted']  # Order by date_posted, newest first (- means descending)
     paginate_by = 5  # Show 5 posts per page
+    
+    def get_queryset(self):
+        """
+        Load each page's authors with a join and its tags in one extra query
+        """
+        return super().get_queryset().select_related('author').prefetch_related('tags')
+    
+    def get_context_data(self, **kwargs):
+        """
+        Add the tag cloud for the sidebar
+        Reads the stored post_count on each tag - no counting query needed
+        """
+        context = super().get_context_data(**kwargs)
+        context['tag_cloud'] = Tag.objects.filter(post_count__gt=0).order_by('-post_count', 'name')[:30]
+        return context
+    
+    def get_surrogate_keys(self, context):
+        cloud = {keys.tag_key(tag.pk) for tag in context['tag_cloud']}
+        return {keys.POST_LIST_KEY} | cloud | keys.keys_for_posts(context['posts'])
 
-class UserPostListView(ListView):
+class UserPostListView(keys.SurrogateKeysMixin, ListView):
     """
     Display posts by a specific user
     Similar to PostListView but filtered by author
@@ -121,18 +182,74 @@ class UserPostListView(ListView):
         self.kwargs contains URL parameters (like username from the URL)
         """
         # Get the user from the URL parameter, or return 404 if not found
-        user = get_object_or_404(User, username=self.kwargs.get('username'))
+        self.author = get_object_or_404(User, username=self.kwargs.get('username'))
         
-        # Return only posts by this user, ordered by date
-        return Post.objects.filter(author=user).order_by('-date_posted')
+        # Return only posts by this user, ordered by date, with their tags
+        return Post.objects.filter(author=self.author).order_by('-date_posted') \
+            .select_related('author').prefetch_related('tags')
+    
+    def get_surrogate_keys(self, context):
+        # The author key is included even when the page has no posts on it
+        return {keys.author_list_key(self.author.pk), keys.author_key(self.author.pk)} \
+            | keys.keys_for_posts(context['posts'])
+
+class StoredCountPaginator(Paginator):
+    """
+    Paginator that is given the total up front instead of running COUNT(*)
+    """
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._stored_count = count
+    
+    @property
+    def count(self):
+        return self._stored_count
 
-class PostDetailView(DetailView):
+class TagPostListView(keys.SurrogateKeysMixin, ListView):
+    """
+    Display posts carrying a specific tag, newest first
+    The query walks the (tag, date_posted) index on the PostTag through
+    table, and the page count comes from the tag's stored post_count rather
+    than counting all of the tag's posts on every view. Deep pages still pay
+    for the OFFSET past the posts before them.
+    """
+    model = Post
+    template_name = 'miniblog/tag_posts.html'
+    context_object_name = 'posts'
+    paginate_by = 5
+    
+    def get_queryset(self):
+        # Get the tag from the URL, or return 404 if it does not exist
+        self.tag = get_object_or_404(Tag, slug=self.kwargs.get('slug'))
+        
+        return Post.objects.filter(posttag__tag=self.tag) \
+            .order_by('-posttag__date_posted', '-posttag__post_id') \
+            .select_related('author').prefetch_related('tags')
+    
+    def get_paginator(self, queryset, per_page, **kwargs):
+        # post_count is kept up to date by Post.set_tags - no COUNT(*) needed
+        return StoredCountPaginator(queryset, per_page, count=self.tag.post_count, **kwargs)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tag'] = self.tag
+        return context
+    
+    def get_surrogate_keys(self, context):
+        return {keys.tag_list_key(self.tag.pk), keys.tag_key(self.tag.pk)} \
+            | keys.keys_for_posts(context['posts'])
+
+class PostDetailView(keys.SurrogateKeysMixin, DetailView):
     """
     Display a single blog post with its comments
     DetailView handles displaying a single object
     """
     model = Post
     
+    def get_queryset(self):
+        # Tags are read by both the badges and the surrogate keys - load them once
+        return super().get_queryset().prefetch_related('tags')
+    
     def get_context_data(self, **kwargs):
         """
         Add extra data to the template context
@@ -144,7 +261,20 @@ class PostDetailView(DetailView):
         # Add an empty comment form to the context
         context['comment_form'] = CommentForm()
         
+        # Load the comments with their authors in one query
+        context['comments'] = list(self.object.comments.select_related('author'))
+        
+        # The live stream resumes after the newest comment rendered here
+        context['last_comment_id'] = max((comment.pk for comment in context['comments']), default=0)
+        
         return context
+    
+    def get_surrogate_keys(self, context):
+        # Comments get their own key so a new comment leaves the listings
+        # cached; comment authors are shown too, so renaming one purges this page
+        return keys.keys_for_posts([self.object]) | {keys.comments_key(self.object.pk)} | {
+            keys.author_key(comment.author_id) for comment in context['comments'] if comment.author_id
+        }
 
 class PostCreateView(LoginRequiredMixin, CreateView):
     """
@@ -236,6 +366,9 @@ def add_comment(request, pk):
             # Now save to database
             comment.save()
             
+            # Push the comment to readers watching this post once it is committed
+            transaction.on_commit(lambda: publish_comment(comment))
+            
             # Show success message
             messages.success(request, 'Your comment has been added!')
             
@@ -245,6 +378,56 @@ def add_comment(request, pk):
     # If GET request or form invalid, redirect back to post
     return redirect('post-detail', pk=post.pk)
 
+def comment_stream(request, pk):
+    """
+    Fallback for the live comment stream
+    Under ASGI this URL is answered by miniblog.events.CommentStreamRouter
+    (installed in config/asgi.py) before Django sees it. Under WSGI a
+    long-lived stream would pin a worker thread for its whole lifetime, so
+    reply 204, which tells EventSource to stop reconnecting.
+    """
+    get_object_or_404(Post, pk=pk)
+    return HttpResponse(status=204)
+
+# =============================================================================
+# SITEMAPS
+# =============================================================================
+
+def _base_url(request):
+    """
+    Scheme and host of the current request, e.g. https://example.com
+    """
+    return request.build_absolute_uri('/').rstrip('/')
+
+def sitemap_index(request):
+    """
+    Sitemap index listing every child sitemap (post and author shards)
+    """
+    keys.add_surrogate_keys(request, keys.SITEMAP_KEY)
+    document = sitemaps.render_index(_base_url(request))
+    return HttpResponse(document, content_type='application/xml')
+
+def sitemap_section(request, section, shard):
+    """
+    One child sitemap - a shard of posts or authors by id range
+    Served from cache when the shard is unchanged, otherwise streamed
+    straight from a keyset scan of the database.
+    """
+    keys.add_surrogate_keys(request, keys.SITEMAP_KEY)
+    document, chunks = sitemaps.stream_shard(sitemaps.SECTIONS[section], shard, _base_url(request))
+    if document is not None:
+        return HttpResponse(document, content_type='application/xml')
+    if chunks is None:
+        raise Http404('Empty sitemap shard')
+    return StreamingHttpResponse(chunks, content_type='application/xml')
+
+def robots_txt(request):
+    """
+    robots.txt pointing crawlers at the sitemap instead of paginated lists
+    """
+    sitemap_url = request.build_absolute_uri(reverse('sitemap'))
+    return HttpResponse(sitemaps.render_robots(sitemap_url), content_type='text/plain')
+
 # =============================================================================
 # STATIC PAGES
 # =============================================================================
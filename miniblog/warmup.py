@@ -0,0 +1,291 @@
+# Import standard library tools
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+# Warm-up - do a worker's one-off startup work before it serves traffic.
+#
+# A fresh process pays for several things on its first request: building the
+# URL resolvers, compiling every template it renders, loading model metadata,
+# password hashers and translation catalogs, and opening the database
+# connection. warm_up() does all of that up front. Under gunicorn with
+# preload_app (config/gunicorn.conf.py) it runs once in the master, and every
+# forked worker starts with the warmed state already in memory, shared
+# copy-on-write instead of rebuilt per worker.
+#
+# This module must stay importable before Django is set up: `python -m
+# miniblog.warmup` is the child process the startup profile measures.
+
+logger = logging.getLogger(__name__)
+
+# One line of `python -X importtime` output: self us | cumulative us | module
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S.*)$')
+
+
+# =============================================================================
+# WARM-UP STEPS
+# =============================================================================
+
+def _timed(steps, name, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    steps.append({'step': name, 'ms': (time.perf_counter() - started) * 1000, 'detail': result})
+    return result
+
+
+def warm_models():
+    """
+    Build the field and relation caches of every model
+    """
+    from django.apps import apps
+    models = apps.get_models()
+    for model in models:
+        model._meta.get_fields()
+    return f'{len(models)} models'
+
+
+def _walk_patterns(resolver):
+    # Compile each pattern's regex and descend into include()d URLconfs
+    count = 0
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex  # Compiled lazily on first access
+        if hasattr(pattern, 'url_patterns'):
+            count += _walk_patterns(pattern)
+        else:
+            count += 1
+    return count
+
+
+def warm_urls():
+    """
+    Import every URLconf and populate the resolvers used by resolve() and reverse()
+    """
+    from django.urls import get_resolver
+    resolver = get_resolver()
+    resolver.reverse_dict  # Populates the reverse lookup tables, nested ones included
+    return f'{_walk_patterns(resolver)} patterns'
+
+
+def project_templates():
+    """
+    Yield (engine, template name) for every template inside the project
+    Templates shipped with Django itself (admin etc.) are left alone.
+    """
+    from django.conf import settings
+    from django.template import engines
+
+    base_dir = Path(settings.BASE_DIR).resolve()
+    for engine in engines.all():
+        for directory in getattr(engine, 'template_dirs', ()):
+            directory = Path(directory).resolve()
+            if not directory.is_relative_to(base_dir) or not directory.is_dir():
+                continue
+            for path in sorted(directory.rglob('*')):
+                if path.is_file() and path.suffix in ('.html', '.txt', '.xml'):
+                    yield engine, path.relative_to(directory).as_posix()
+
+
+def warm_templates():
+    """
+    Compile every project template into the cached template loader
+    """
+    count = 0
+    for engine, name in project_templates():
+        engine.get_template(name)
+        count += 1
+    return f'{count} templates'
+
+
+def warm_auth():
+    """
+    Import the configured password hashers
+    """
+    from django.contrib.auth.hashers import get_hashers
+    return f'{len(get_hashers())} hashers'
+
+
+def warm_translations():
+    """
+    Load the translation catalogs for the default language
+    """
+    from django.conf import settings
+    from django.utils import translation
+    if not settings.USE_I18N:
+        return 'i18n disabled'
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('')
+    return settings.LANGUAGE_CODE
+
+
+def warm_database():
+    """
+    Open each database connection once, running its one-off setup
+    The connections are closed afterwards (see warm_up).
+    """
+    from django.db import connections
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    return ', '.join(connections)
+
+
+def request(application, path):
+    """
+    Send one GET request straight into a WSGI application
+    Returns the status code.
+    """
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': False,
+        'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    status = []
+    response = application(environ, lambda code, headers, exc_info=None: status.append(code))
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split()[0])
+
+
+def warm_requests(application, urls):
+    """
+    Serve each warm-up URL once so the whole request path has run
+    A URL that does not answer 2xx is logged - its path was only partly warmed,
+    and it usually means the site itself is broken (e.g. missing migrations).
+    """
+    results = []
+    for url in urls:
+        status = request(application, url)
+        if not 200 <= status < 300:
+            logger.warning('Warm-up request for %s returned %d', url, status)
+        results.append(f'{url} {status}')
+    return ', '.join(results)
+
+
+def warm_up(application=None, urls=None):
+    """
+    Run every warm-up step and return their timings
+    application is the WSGI app to send warm-up requests through (default:
+    settings.WSGI_APPLICATION); urls defaults to settings.WARMUP_URLS.
+    Returns a list of {'step', 'ms', 'detail'} dicts.
+    """
+    from django.conf import settings
+    from django.db import connections
+
+    if application is None:
+        from django.utils.module_loading import import_string
+        application = import_string(settings.WSGI_APPLICATION)
+    if urls is None:
+        urls = getattr(settings, 'WARMUP_URLS', ['/'])
+
+    steps = []
+    try:
+        _timed(steps, 'models', warm_models)
+        _timed(steps, 'urls', warm_urls)
+        _timed(steps, 'templates', warm_templates)
+        _timed(steps, 'auth', warm_auth)
+        _timed(steps, 'translations', warm_translations)
+        _timed(steps, 'database', warm_database)
+        if urls:
+            _timed(steps, 'requests', warm_requests, application, urls)
+    finally:
+        # A connection must never be shared across a fork - each worker opens its own
+        connections.close_all()
+    return steps
+
+
+# =============================================================================
+# STARTUP PROFILE
+# =============================================================================
+
+def _profile_child(warm, urls):
+    """
+    Body of the profiled child process - prints its timings as JSON
+    """
+    started = time.perf_counter()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    # Load the app exactly as a server would - importing config.wsgi sets Django up
+    from django.conf import settings
+    from django.utils.module_loading import import_string
+    application = import_string(settings.WSGI_APPLICATION)
+    result = {'app_load_ms': (time.perf_counter() - started) * 1000, 'warm_up': [], 'requests': []}
+
+    if warm:
+        result['warm_up'] = warm_up(application)
+    for url in urls:
+        timings = []
+        for _ in range(2):
+            request_started = time.perf_counter()
+            status = request(application, url)
+            timings.append((time.perf_counter() - request_started) * 1000)
+        result['requests'].append({'url': url, 'status': status, 'first_ms': timings[0], 'repeat_ms': timings[1]})
+    print(json.dumps(result))
+
+
+def parse_import_times(stderr):
+    """
+    Parse `python -X importtime` output into a list of module timings
+    Each entry has module, self_ms, cumulative_ms and depth (nesting level).
+    """
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append({
+                'module': module.strip(),
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+                'depth': len(indent) // 2,
+            })
+    return modules
+
+
+def profile_startup(warm, urls, cwd=None):
+    """
+    Start a fresh Python process, load the app and time its first requests
+    With warm=True the warm-up runs before the requests, as it would in a
+    preloaded gunicorn master. Returns the child's timings plus its
+    per-module import times.
+    """
+    command = [sys.executable, '-X', 'importtime', '-m', 'miniblog.warmup', '--profile-child']
+    if warm:
+        command.append('--warm')
+    command += list(urls)
+    completed = subprocess.run(command, cwd=cwd, capture_output=True, text=True, env=os.environ.copy())
+    if completed.returncode != 0:
+        raise RuntimeError(f'Startup profile failed:\n{completed.stderr[-2000:]}')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['imports'] = parse_import_times(completed.stderr)
+    return result
+
+
+def summarise_imports(imports, package_depth=1):
+    """
+    Group self import time by top-level package, largest first
+    """
+    totals = {}
+    for entry in imports:
+        package = '.'.join(entry['module'].split('.')[:package_depth])
+        totals[package] = totals.get(package, 0) + entry['self_ms']
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    if arguments[:1] == ['--profile-child']:
+        arguments = arguments[1:]
+        warm = '--warm' in arguments
+        _profile_child(warm, [url for url in arguments if url != '--warm'])